@@ -2,21 +2,36 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 
-from sheets_service import get_sheet_data, append_row, update_row
-from auth_service import authenticate_user, verify_token
+from sheets_service import get_sheet_data, append_row, update_row, start_drive_cleanup, start_mirror
+from auth_service import authenticate_user, verify_token, list_users, invalidate_users_index
 
 # 🔐 Centralized permissions
-from permissions import SHEET_PERMISSIONS
+from permissions import is_allowed
+import inventory_service
+import reference_data
 
 app = Flask(__name__)
 
+# Pick up Drive deletions left queued by a previous run
+try:
+    start_drive_cleanup()
+except Exception as e:
+    print(f"Drive cleanup worker not started: {e}")
+
+# Full mirror load in the background (SHEETS_MIRROR=1)
+try:
+    start_mirror()
+except Exception as e:
+    print(f"Mirror sync worker not started: {e}")
+
 # =====================================================
 # ✅ CORS (ENV-based, PROD + PREVIEW SAFE)
 # =====================================================
 CORS(
     app,
     origins=os.environ.get("FRONTEND_URL", "*").split(","),
-    supports_credentials=True
+    supports_credentials=True,
+    expose_headers=["ETag"]
 )
 
 # =====================================================
@@ -53,9 +68,8 @@ def require_token(func):
 # =====================================================
 def check_permission(sheet_name, action):
     role = request.user.get("role")
-    allowed_roles = SHEET_PERMISSIONS.get(sheet_name, {}).get(action, [])
 
-    if role not in allowed_roles:
+    if not is_allowed(role, sheet_name, action):
         return jsonify({
             "status": "error",
             "message": f"Access denied: {role} cannot {action} in {sheet_name}"
@@ -64,6 +78,39 @@ def check_permission(sheet_name, action):
     return None
 
 
+# =====================================================
+# ✅ Helper: Request payload (JSON or multipart)
+#
+# Add/Edit accept either a JSON body (files as Base64
+# data URLs) or multipart/form-data, where photos and
+# PDFs arrive as file parts and are streamed to Drive.
+# =====================================================
+def check_file_parts(sheet_name, edit=False):
+    """Error response if the request has file parts this sheet can't store."""
+    from sheets_service import accepts_upload
+
+    rejected = [
+        key for key, upload in request.files.items()
+        if upload.filename and not accepts_upload(sheet_name, key, edit)
+    ]
+    if rejected:
+        return jsonify({
+            "status": "error",
+            "message": f"File uploads are not supported here for: {', '.join(rejected)}"
+        }), 400
+    return None
+
+
+def get_request_payload():
+    if request.mimetype == "multipart/form-data":
+        data = request.form.to_dict()
+        for key, upload in request.files.items():
+            if upload.filename:
+                data[key] = upload
+        return data
+    return request.get_json() or {}
+
+
 # =====================================================
 # ✅ LOGIN
 # =====================================================
@@ -90,10 +137,8 @@ def protected():
 @app.route("/api/usernames", methods=["GET"])
 @require_token
 def get_usernames():
-    from sheets_service import client, SPREADSHEET_ID
     try:
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet("Users")
-        records = sheet.get_all_records()
+        records = list_users()
         return jsonify([
             {
                 "Name": r.get("Full Name") or r.get("Name"),
@@ -113,18 +158,7 @@ def get_usernames():
 @require_token
 def get_machinery_types():
     try:
-        from sheets_service import client, SPREADSHEET_ID
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet('Machinery_Types')
-        records = sheet.get_all_records()
-        machinery_types = [
-            {
-                'english': r.get('English', ''),
-                'arabic': r.get('Arabic', ''),
-                'mapping': r.get('Equipment_Type_Mapping', '')
-            }
-            for r in records if r.get('English')
-        ]
-        return jsonify(machinery_types)
+        return jsonify(reference_data.machinery_types_dropdown())
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -138,7 +172,7 @@ def get_suivi():
     check = check_permission('Suivi', 'view')
     if check:
         return check
-    return get_sheet_data('Suivi')
+    return get_sheet_data('Suivi', request.args)
 
 
 # =====================================================
@@ -156,7 +190,12 @@ def get_data(sheet_name):
     if check:
         return check
 
-    return get_sheet_data(sheet_key)
+    # Optional ?limit=&cursor=&sort=&from=&to=&<Column>= are evaluated server-side
+    return get_sheet_data(sheet_key, request.args)
+
+
+# Sheets summed up by /api/hse/inventory
+INVENTORY_SHEETS = ("PPE_Stock", "PPE_Distribution_Log")
 
 
 # =====================================================
@@ -165,12 +204,56 @@ def get_data(sheet_name):
 @app.route("/api/add/<sheet_name>", methods=["POST"])
 @require_token
 def add_row_api(sheet_name):
-    check = check_permission(sheet_name, "add")
+    check = check_permission(sheet_name, "add") or check_file_parts(sheet_name)
+    if check:
+        return check
+
+    new_row = get_request_payload()
+    if sheet_name == "PPE_Distribution_Log":
+        # Same availability check and item lock as /api/hse/distribute
+        result = inventory_service.add_distribution(new_row, lambda row: append_row(sheet_name, row))
+    else:
+        result = append_row(sheet_name, new_row)
+    if sheet_name == "Users":
+        invalidate_users_index()
+    if sheet_name in reference_data.REFERENCE_SHEETS:
+        reference_data.invalidate(sheet_name)
+    if sheet_name == "PPE_Stock" and result.get("status") == "success":
+        if result.get("queued"):
+            inventory_service.invalidate()
+        else:
+            inventory_service.record_restock(new_row.get("PPE_Type", ""), new_row.get("Size", ""), new_row.get("Quantity"))
+    return jsonify(result)
+
+
+# =====================================================
+# ✅ Write-behind job status (queued appends)
+# =====================================================
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+@require_token
+def get_job_status(job_id):
+    from sheets_service import get_append_job
+
+    job = get_append_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown or expired job"}), 404
+    return jsonify({"status": "success", "job": job})
+
+
+# =====================================================
+# ✅ Drive cleanup backlog (replaced / deleted documents)
+# =====================================================
+@app.route("/api/jobs/drive-cleanup", methods=["GET"])
+@require_token
+def get_drive_cleanup_stats():
+    import drive_cleanup
+
+    # Admin only (same roles as the Users page)
+    check = check_permission("Users", "view")
     if check:
         return check
 
-    new_row = request.get_json() or {}
-    return jsonify(append_row(sheet_name, new_row))
+    return jsonify({"status": "success", "cleanup": drive_cleanup.stats()})
 
 
 # =====================================================
@@ -179,17 +262,54 @@ def add_row_api(sheet_name):
 @app.route("/api/edit/<sheet_name>/<int:row_index>", methods=["PUT"])
 @require_token
 def edit_row(sheet_name, row_index):
-    check = check_permission(sheet_name, "edit")
+    check = check_permission(sheet_name, "edit") or check_file_parts(sheet_name, edit=True)
     if check:
         return check
 
     try:
-        updated_data = request.get_json() or {}
-        return jsonify(update_row(sheet_name, row_index, updated_data))
+        updated_data = get_request_payload()
+        result = update_row(sheet_name, row_index, updated_data)
+        if sheet_name == "Users":
+            invalidate_users_index()
+        if sheet_name in reference_data.REFERENCE_SHEETS:
+            reference_data.invalidate(sheet_name)
+        if sheet_name in INVENTORY_SHEETS:
+            inventory_service.invalidate()
+        return jsonify(result)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# =====================================================
+# 🆕 BULK EDIT
+# Body: {"rows": [{"row_index": 5, "data": {...}}, ...]}
+# All rows are read in one call and written in one call.
+# =====================================================
+@app.route("/api/edit-bulk/<sheet_name>", methods=["PUT"])
+@require_token
+def edit_rows(sheet_name):
+    from sheets_service import update_rows
+
+    check = check_permission(sheet_name, "edit")
+    if check:
+        return check
+
+    data = request.get_json(silent=True) or {}
+    rows = data.get("rows")
+    if not isinstance(rows, list) or not rows or not all(isinstance(r, dict) for r in rows):
+        return jsonify({"status": "error", "message": "rows must be a non-empty list of {row_index, data}"}), 400
+
+    result = update_rows(sheet_name, [(r.get("row_index"), r.get("data")) for r in rows])
+    if result.get("status") == "success":
+        if sheet_name == "Users":
+            invalidate_users_index()
+        if sheet_name in reference_data.REFERENCE_SHEETS:
+            reference_data.invalidate(sheet_name)
+        if sheet_name in INVENTORY_SHEETS:
+            inventory_service.invalidate()
+    return jsonify(result)
+
+
 # =====================================================
 # ✅ DELETE (fully centralized)
 # =====================================================
@@ -203,13 +323,54 @@ def delete_row_api(sheet_name, row_index):
         return check
 
     try:
-        return jsonify(delete_row(sheet_name, row_index))
+        result = delete_row(sheet_name, row_index)
+        if sheet_name == "Users":
+            invalidate_users_index()
+        if sheet_name in reference_data.REFERENCE_SHEETS:
+            reference_data.invalidate(sheet_name)
+        if sheet_name in INVENTORY_SHEETS:
+            inventory_service.invalidate()
+        return jsonify(result)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# =====================================================
+# 🆕 BULK DELETE — body: {"rows": [row_index, ...]}
+# All rows go in one batchUpdate; their files are
+# removed from Drive by the background cleanup.
+# =====================================================
+@app.route("/api/delete-bulk/<sheet_name>", methods=["DELETE", "POST"])
+@require_token
+def delete_rows_api(sheet_name):
+    from sheets_service import delete_rows
+
+    check = check_permission(sheet_name, "delete")
+    if check:
+        return check
+
+    data = request.get_json(silent=True) or {}
+    rows = data.get("rows")
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"status": "error", "message": "rows must be a non-empty list"}), 400
+
+    result = delete_rows(sheet_name, rows)
+    if result.get("status") == "success":
+        if sheet_name == "Users":
+            invalidate_users_index()
+        if sheet_name in reference_data.REFERENCE_SHEETS:
+            reference_data.invalidate(sheet_name)
+        if sheet_name in INVENTORY_SHEETS:
+            inventory_service.invalidate()
+    return jsonify(result)
+
+
 # =====================================================
 # 🆕 HSE: Restock — Add received PPE to stock
+#
+# Stock rows are located and adjusted by
+# inventory_service.adjust_stock: keyed row index,
+# per-item lock, only the changed cells written.
 # =====================================================
 @app.route('/api/hse/restock', methods=['POST'])
 @require_token
@@ -230,47 +391,25 @@ def hse_restock():
     if not ppe_type or quantity <= 0:
         return jsonify({'status': 'error', 'message': 'PPE type and positive quantity are required'}), 400
 
-    from sheets_service import client, SPREADSHEET_ID, get_current_time
+    from sheets_service import invalidate_sheet_cache, invalidate_schema
     try:
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet('PPE_Stock')
-        records = sheet.get_all_records()
-        headers = sheet.row_values(1)
-        col_letter = chr(64 + len(headers))
-        current_time = get_current_time()
-
-        # If this PPE type + size already exists, add to it
-        for idx, row in enumerate(records, start=2):
-            if row.get('PPE_Type', '').strip() == ppe_type and str(row.get('Size', '')).strip() == size:
-                new_qty = int(row.get('Quantity', 0)) + quantity
-                existing = sheet.row_values(idx)
-                if len(existing) < len(headers):
-                    existing += [''] * (len(headers) - len(existing))
-                row_dict = dict(zip(headers, existing))
-                row_dict['Quantity'] = new_qty
-                row_dict['Last_Updated'] = current_time
-                row_dict['Added_by'] = added_by
-                sheet.update(
-                    range_name=f'A{idx}:{col_letter}{idx}',
-                    values=[[row_dict.get(h, '') for h in headers]]
-                )
-                return jsonify({'status': 'success', 'new_quantity': new_qty, 'action': 'updated'})
-
-        # If not found — create a new row
-        new_row = {h: '' for h in headers}
-        new_row['PPE_Type'] = ppe_type
-        new_row['Size'] = size
-        new_row['Quantity'] = quantity
-        new_row['Last_Updated'] = current_time
-        new_row['Added_by'] = added_by
-        sheet.append_row([new_row.get(h, '') for h in headers])
-        return jsonify({'status': 'success', 'new_quantity': quantity, 'action': 'created'})
+        # Adds to the existing PPE type + size row, or creates it
+        result = inventory_service.adjust_stock(ppe_type, size, quantity, added_by=added_by, create=True)
+        return jsonify(result)
 
     except Exception as e:
+        invalidate_sheet_cache('PPE_Stock')
+        invalidate_schema('PPE_Stock')
+        inventory_service.invalidate()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
 # =====================================================
 # 🆕 HSE: Distribute — Issue PPE to a worker
+#
+# One line of /api/hse/distribute/bulk: the issue is
+# checked against restocked − distributed and logged;
+# PPE_Stock is not touched.
 # =====================================================
 @app.route('/api/hse/distribute', methods=['POST'])
 @require_token
@@ -280,80 +419,72 @@ def hse_distribute():
         return check
 
     data = request.get_json() or {}
-    ppe_type = data.get('PPE_Type', '').strip()
-    size = str(data.get('Size', '')).strip()
-    worker_name = data.get('Worker_Name', '').strip()
-    worker_position = data.get('Worker_Position', '').strip()
-    notes = data.get('Notes', '').strip()
+    from sheets_service import invalidate_sheet_cache, invalidate_schema
     try:
-        quantity = int(data.get('Quantity', 1))
-    except (ValueError, TypeError):
-        return jsonify({'status': 'error', 'message': 'Invalid quantity'}), 400
+        given_by = request.user.get('full_name') or request.user.get('username', '')
+        result = inventory_service.distribute_bulk([data], given_by)[0]
+        if result['status'] != 'success':
+            return jsonify({'status': 'error', 'message': result['message']}), 400
 
-    if not ppe_type or not worker_name or quantity <= 0:
-        return jsonify({'status': 'error', 'message': 'PPE type, worker name, and positive quantity are required'}), 400
+        remaining = result['remaining_stock']
+        return jsonify({
+            'status': 'success',
+            'remaining_stock': remaining,
+            'message': f'PPE issued successfully. Remaining stock: {remaining}'
+        })
 
-    from sheets_service import client, SPREADSHEET_ID, get_current_time
-    try:
-        current_time = get_current_time()
-
-        # --- Step 1: Find stock row and check quantity ---
-        stock_sheet = client.open_by_key(SPREADSHEET_ID).worksheet('PPE_Stock')
-        stock_records = stock_sheet.get_all_records()
-        stock_headers = stock_sheet.row_values(1)
-        col_letter = chr(64 + len(stock_headers))
-
-        stock_row_idx = None
-        current_qty = 0
-        for idx, row in enumerate(stock_records, start=2):
-            if row.get('PPE_Type', '').strip() == ppe_type and str(row.get('Size', '')).strip() == size:
-                stock_row_idx = idx
-                current_qty = int(row.get('Quantity', 0))
-                break
-
-        if stock_row_idx is None:
-            label = ppe_type + (f' size {size}' if size else '')
-            return jsonify({'status': 'error', 'message': f'No stock found for {label}. Please add stock first.'}), 400
-
-        if current_qty < quantity:
-            return jsonify({'status': 'error', 'message': f'Not enough stock. Only {current_qty} available.'}), 400
-
-        # --- Step 2: Deduct from stock ---
-        new_qty = current_qty - quantity
-        existing = stock_sheet.row_values(stock_row_idx)
-        if len(existing) < len(stock_headers):
-            existing += [''] * (len(stock_headers) - len(existing))
-        row_dict = dict(zip(stock_headers, existing))
-        row_dict['Quantity'] = new_qty
-        row_dict['Last_Updated'] = current_time
-        stock_sheet.update(
-            range_name=f'A{stock_row_idx}:{col_letter}{stock_row_idx}',
-            values=[[row_dict.get(h, '') for h in stock_headers]]
-        )
+    except Exception as e:
+        invalidate_sheet_cache('PPE_Distribution_Log')
+        invalidate_schema('PPE_Distribution_Log')
+        inventory_service.invalidate()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+# =====================================================
+# 🆕 HSE: Bulk distribute — Issue PPE to a whole crew
+#
+# Body: {"items": [{PPE_Type, Size, Quantity,
+#   Worker_Name, Worker_Position, Notes}, ...]}
+# Availability (restocked − distributed) is checked
+# once, by the same rule as /api/hse/distribute; all
+# log rows are written in one call. PPE_Stock is not
+# touched. Each line gets its own result.
+# =====================================================
+MAX_BULK_LINES = 500
 
-        # --- Step 3: Log the distribution ---
-        log_sheet = client.open_by_key(SPREADSHEET_ID).worksheet('PPE_Distribution_Log')
-        log_headers = log_sheet.row_values(1)
-        given_by = request.user.get('full_name') or request.user.get('username', '')
-        log_row = {
-            'Date': current_time,
-            'Worker_Name': worker_name,
-            'Worker_Position': worker_position,
-            'PPE_Type': ppe_type,
-            'Size': size,
-            'Quantity': quantity,
-            'Given_By': given_by,
-            'Notes': notes
-        }
-        log_sheet.append_row([log_row.get(h, '') for h in log_headers])
 
+@app.route('/api/hse/distribute/bulk', methods=['POST'])
+@require_token
+def hse_distribute_bulk():
+    check = check_permission('PPE_Distribution_Log', 'add')
+    if check:
+        return check
+
+    data = request.get_json() or {}
+    lines = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'status': 'error', 'message': 'A non-empty list of items is required'}), 400
+    if len(lines) > MAX_BULK_LINES:
+        return jsonify({'status': 'error', 'message': f'At most {MAX_BULK_LINES} items per request'}), 400
+
+    from sheets_service import invalidate_sheet_cache, invalidate_schema
+    try:
+        given_by = request.user.get('full_name') or request.user.get('username', '')
+        results = inventory_service.distribute_bulk(lines, given_by)
+        issued = sum(1 for r in results if r['status'] == 'success')
         return jsonify({
-            'status': 'success',
-            'remaining_stock': new_qty,
-            'message': f'PPE issued successfully. Remaining stock: {new_qty}'
+            'status': 'success' if issued == len(results) else ('partial' if issued else 'error'),
+            'issued': issued,
+            'failed': len(results) - issued,
+            'results': results
         })
 
     except Exception as e:
+        invalidate_sheet_cache('PPE_Stock')
+        invalidate_sheet_cache('PPE_Distribution_Log')
+        invalidate_schema('PPE_Stock')
+        invalidate_schema('PPE_Distribution_Log')
+        inventory_service.invalidate()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
@@ -382,9 +513,18 @@ def hse_delete_distribution(row_index):
     # implicit "return" since available = stock - dist recalculates.
     return_to_stock = request.args.get('return_to_stock', 'false').lower() == 'true'
 
-    from sheets_service import delete_row
+    from sheets_service import delete_row, get_schema
     try:
-        delete_row('PPE_Distribution_Log', row_index)
+        # Keep the row so its quantity can be taken off the inventory totals
+        log_schema = get_schema('PPE_Distribution_Log')
+        log_headers = log_schema['headers']
+        old_row = dict(zip(log_headers, log_schema['worksheet'].row_values(row_index)))
+
+        result = delete_row('PPE_Distribution_Log', row_index)
+        if result.get('status') == 'success':
+            inventory_service.record_distribution(old_row, -1)
+        else:
+            inventory_service.invalidate()
         msg = 'Log deleted and item returned to stock.' if return_to_stock else 'Log deleted successfully.'
         return jsonify({'status': 'success', 'message': msg})
     except Exception as e:
@@ -420,12 +560,12 @@ def hse_edit_distribution(row_index):
     if not new_ppe_type or not new_worker_name or new_quantity <= 0:
         return jsonify({'status': 'error', 'message': 'PPE type, worker name, and positive quantity are required'}), 400
 
-    from sheets_service import client, SPREADSHEET_ID, get_current_time
+    from sheets_service import get_schema, row_range, get_current_time, invalidate_sheet_cache, invalidate_schema
     try:
         current_time   = get_current_time()
-        log_sheet      = client.open_by_key(SPREADSHEET_ID).worksheet('PPE_Distribution_Log')
-        log_headers    = log_sheet.row_values(1)
-        log_col_letter = chr(64 + len(log_headers))
+        log_schema     = get_schema('PPE_Distribution_Log')
+        log_sheet      = log_schema['worksheet']
+        log_headers    = log_schema['headers']
 
         # Read existing row to preserve original Date and Given_By
         row_data = log_sheet.row_values(row_index)
@@ -446,12 +586,38 @@ def hse_edit_distribution(row_index):
             'Notes':           new_notes,
         }
         log_sheet.update(
-            range_name=f'A{row_index}:{log_col_letter}{row_index}',
+            range_name=row_range(log_schema, row_index),
             values=[[updated_log.get(h, '') for h in log_headers]]
         )
+        invalidate_sheet_cache('PPE_Distribution_Log')
+        inventory_service.record_distribution(old_row, -1)
+        inventory_service.record_distribution(updated_log)
 
         return jsonify({'status': 'success', 'message': 'Distribution log updated successfully.'})
 
+    except Exception as e:
+        invalidate_schema('PPE_Distribution_Log')
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+# =====================================================
+# 🆕 HSE: Inventory — available stock per PPE type/size
+#
+# Served from inventory_service's running totals, so the
+# cost doesn't grow with the distribution log:
+#   available = sum(PPE_Stock.Quantity)
+#             - sum(PPE_Distribution_Log.Quantity)
+# plus the quantity distributed per month.
+# =====================================================
+@app.route('/api/hse/inventory', methods=['GET'])
+@require_token
+def hse_inventory():
+    check = check_permission('PPE_Stock', 'view')
+    if check:
+        return check
+
+    try:
+        return jsonify({'status': 'success', **inventory_service.get_inventory()})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
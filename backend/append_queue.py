@@ -0,0 +1,168 @@
+# backend/append_queue.py
+# ==========================================
+# Durable queue behind the write-behind appends
+# (see "Write-behind queue" in sheets_service)
+# ==========================================
+#
+# Queued rows and their job states live in a local SQLite
+# file, so every gunicorn worker on the host sees the same
+# jobs (a /api/jobs/<id> poll can land on any of them) and
+# rows that were acknowledged but not yet written survive
+# a crash or restart.
+#
+# A worker claims a batch by marking it "writing" with a
+# lease; if it dies before recording the outcome, the
+# batch becomes due again once the lease runs out. Rows
+# are therefore written at least once.
+#
+# This module only keeps the queue; sheets_service does
+# the actual appends.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+APPEND_QUEUE_PATH = os.environ.get(
+    "WRITE_BEHIND_QUEUE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "append_queue.db")
+)
+APPEND_LEASE = int(os.environ.get("WRITE_BEHIND_LEASE", "300"))  # seconds a claimed batch stays hidden
+
+_local = threading.local()
+
+
+def _conn():
+    """One SQLite connection per thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(APPEND_QUEUE_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS append_jobs ("
+            " job_id TEXT PRIMARY KEY, sheet TEXT NOT NULL, headers TEXT NOT NULL,"
+            " row_values TEXT NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT, row_index INTEGER, next_try REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_append_jobs_due ON append_jobs (state, next_try)")
+        _local.conn = conn
+    return conn
+
+
+# =====================================================
+#  ✅  Queue / status
+# =====================================================
+def enqueue(job_id, sheet_name, headers, values):
+    now = time.time()
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT INTO append_jobs (job_id, sheet, headers, row_values, state, next_try, updated_at)"
+            " VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, sheet_name, json.dumps(headers), json.dumps(values, default=str), now, now),
+        )
+
+
+def get(job_id):
+    """Public view of a job, or None if unknown / expired."""
+    row = _conn().execute(
+        "SELECT sheet, state, attempts, error, row_index FROM append_jobs WHERE job_id = ?", (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    sheet, state, attempts, error, row_index = row
+    return {
+        "job_id": job_id,
+        "sheet": sheet,
+        "state": state,
+        "attempts": attempts,
+        "error": error,
+        "row_index": row_index,
+    }
+
+
+# =====================================================
+#  ✅  Claim / record outcome
+# =====================================================
+def claim_due(max_batch, job_ttl, force=False):
+    """
+    Take the due jobs for this worker, and drop finished jobs older
+    than job_ttl.
+
+    Args:
+        force: also take jobs still waiting for their retry delay
+
+    Returns:
+        {sheet_name: [(job_id, headers, values)]} — at most max_batch per sheet
+    """
+    now = time.time()
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")  # write lock: no other process claims in between
+    try:
+        conn.execute(
+            "DELETE FROM append_jobs WHERE state IN ('written', 'failed') AND updated_at < ?",
+            (now - job_ttl,),
+        )
+        # A "writing" job is due again once its lease has run out
+        if force:
+            due = "state IN ('queued', 'retrying') OR (state = 'writing' AND next_try <= ?)"
+        else:
+            due = "state IN ('queued', 'retrying', 'writing') AND next_try <= ?"
+        rows = conn.execute(
+            f"SELECT job_id, sheet, headers, row_values FROM append_jobs WHERE {due} ORDER BY rowid",
+            (now,),
+        ).fetchall()
+        # rowid follows enqueue order, so rows land in the order they were submitted
+        batches = {}
+        claimed = []
+        for job_id, sheet, headers, values in rows:
+            batch = batches.setdefault(sheet, [])
+            if len(batch) < max_batch:
+                batch.append((job_id, json.loads(headers), json.loads(values)))
+                claimed.append(job_id)
+        conn.executemany(
+            "UPDATE append_jobs SET state = 'writing', next_try = ?, updated_at = ? WHERE job_id = ?",
+            [(now + APPEND_LEASE, now, job_id) for job_id in claimed],
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return batches
+
+
+def mark_written(job_ids, first_row):
+    now = time.time()
+    conn = _conn()
+    with conn:
+        conn.executemany(
+            "UPDATE append_jobs SET state = 'written', error = NULL, row_index = ?, updated_at = ? WHERE job_id = ?",
+            [(first_row + offset if first_row else None, now, job_id) for offset, job_id in enumerate(job_ids)],
+        )
+
+
+def mark_failed(job_ids, error, max_attempts):
+    """
+    Schedule a retry with exponential backoff, or give up after max_attempts.
+
+    Returns:
+        the job ids that were given up on
+    """
+    now = time.time()
+    conn = _conn()
+    given_up = []
+    with conn:
+        for job_id in job_ids:
+            row = conn.execute("SELECT attempts FROM append_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                continue
+            attempts = row[0] + 1
+            state = "failed" if attempts >= max_attempts else "retrying"
+            if state == "failed":
+                given_up.append(job_id)
+            conn.execute(
+                "UPDATE append_jobs SET state = ?, attempts = ?, error = ?, next_try = ?, updated_at = ? WHERE job_id = ?",
+                (state, attempts, error, now + min(60, 2 ** attempts), now, job_id),
+            )
+    return given_up
+
@@ -1,51 +1,92 @@
 import os
-import json
-import gspread
+import threading
+import time
 import jwt
 import datetime
-from google.oauth2.service_account import Credentials
+from collections import OrderedDict
 from flask import jsonify
 
-# ✅ Load Google credentials from environment (Render)
-service_account_info = json.loads(os.environ["GOOGLE_CREDENTIALS"])
-service_account_info["private_key"] = service_account_info["private_key"].replace("\\n", "\n")
-
-creds = Credentials.from_service_account_info(
-    service_account_info,
-    scopes=[
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-)
-
-client = gspread.authorize(creds)
+from sheets_service import get_versioned_records, invalidate_sheet_cache
 
 # ✅ Config
-SPREADSHEET_ID = "1j5PbpbLeQFVxofnO69BlluIw851-LZtOCV5HM4NhNOM"
 SECRET_KEY = os.environ.get("JWT_SECRET", "supersecretkey")  # ⚠️ set this in Render ENV vars
 
 
+# =====================================================
+# ✅ Users index (login + name dropdowns)
+#
+# Built from the shared sheet cache (get_versioned_records,
+# the same copy /api/<sheet> serves) and keyed by
+# lowercase username. It is rebuilt whenever the cached
+# Users sheet has a new version. A login naming an
+# unknown user refetches the sheet (at most every
+# USERS_MISS_RELOAD seconds), so a user added directly
+# in the sheet can log in at once.
+# =====================================================
+USERS_MISS_RELOAD = 10  # seconds
+
+_users_index = {"by_username": {}, "users": [], "version": None}
+_users_index_lock = threading.Lock()
+_last_miss_reload = 0.0
+
+
+def _users():
+    """The index, rebuilt first if the cached Users sheet changed."""
+    users, version = get_versioned_records("Users")
+    with _users_index_lock:
+        if _users_index["version"] != version:
+            by_username = {}
+            for user in users:
+                key = str(user.get("Username", "")).strip().lower()
+                if key:
+                    # Several rows may share a username; all are tried on login
+                    by_username.setdefault(key, []).append(user)
+            _users_index.update(by_username=by_username, users=users, version=version)
+        return _users_index
+
+
+def find_users(username):
+    """Users rows matching a username (case-insensitive)."""
+    global _last_miss_reload
+    key = str(username).strip().lower()
+    matches = _users()["by_username"].get(key)
+    if not matches and time.monotonic() - _last_miss_reload > USERS_MISS_RELOAD:
+        _last_miss_reload = time.monotonic()
+        invalidate_sheet_cache("Users")
+        matches = _users()["by_username"].get(key)
+    return matches or []
+
+
+def list_users():
+    """All Users rows (treat as read-only)."""
+    return _users()["users"]
+
+
+def invalidate_users_index():
+    """Rebuild on next use — call after the Users sheet was edited."""
+    with _users_index_lock:
+        _users_index["version"] = None
+
+
 # ✅ USER AUTHENTICATION FUNCTION
 def authenticate_user(username, password):
     """
-    Authenticate a user against Google Sheets 'Users' tab.
+    Authenticate a user against Google Sheets 'Users' tab (via the
+    in-memory Users index).
     Returns a JWT token if credentials are valid.
     """
     try:
         if not username or not password:
             return jsonify({"status": "error", "message": "Missing username or password"}), 400
 
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet("Users")
-        users = sheet.get_all_records()
-
         username = str(username).strip()
         password = str(password).strip()
 
-        for user in users:
+        for user in find_users(username):
             sheet_username = str(user.get("Username", "")).strip()
             sheet_password = str(user.get("Password", "")).strip()
 
-            if sheet_username.lower() == username.lower() and sheet_password == password:
+            if sheet_password == password:
                 payload = {
                     "username": sheet_username,
                     "role": user.get("Role", ""),
@@ -66,13 +107,38 @@ def authenticate_user(username, password):
 
 
 # ✅ TOKEN VERIFICATION FUNCTION
+#
+# Verified tokens are kept in a small LRU so polling
+# endpoints don't redo the HMAC check on every request.
+# A cached token is still rejected once its exp passes.
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "1024"))
+
+_token_cache = OrderedDict()  # token -> decoded payload
+_token_cache_lock = threading.Lock()
+
+
 def verify_token(token):
     """
     Decode and verify a JWT token.
     Returns the payload if valid, otherwise None.
     """
+    with _token_cache_lock:
+        data = _token_cache.get(token)
+        if data is not None:
+            exp = data.get("exp")
+            if exp is None or exp > time.time():
+                _token_cache.move_to_end(token)
+                return data
+            del _token_cache[token]
+            return None
+
     try:
         data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return data
     except Exception:
         return None
+
+    with _token_cache_lock:
+        _token_cache[token] = data
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return data
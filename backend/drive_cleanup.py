@@ -0,0 +1,192 @@
+# backend/drive_cleanup.py
+# ==========================================
+# Background deletion of Drive files that rows
+# no longer use (replaced / deleted documents)
+# ==========================================
+#
+# Requests only queue the file URL; a worker thread does
+# the Drive calls afterwards, retrying failures with a
+# growing delay. The backlog lives in a local SQLite file
+# so pending deletions survive a restart.
+#
+# This module only keeps the queue; sheets_service passes
+# in the function that actually deletes a file.
+
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CLEANUP_PATH = os.environ.get(
+    "DRIVE_CLEANUP_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "drive_cleanup.db")
+)
+CLEANUP_INTERVAL = int(os.environ.get("DRIVE_CLEANUP_INTERVAL", "5"))  # seconds between passes
+CLEANUP_MAX_ATTEMPTS = int(os.environ.get("DRIVE_CLEANUP_MAX_ATTEMPTS", "8"))
+CLEANUP_BATCH = 50
+CLEANUP_WORKERS = int(os.environ.get("DRIVE_CLEANUP_WORKERS", "4"))  # parallel Drive deletes
+# While a worker processes an entry, other processes skip it for this long
+CLEANUP_LEASE = int(os.environ.get("DRIVE_CLEANUP_LEASE", "1800"))  # seconds
+
+_local = threading.local()
+
+_metrics = {"queued": 0, "deleted": 0, "retried": 0, "failed": 0}
+_metrics_lock = threading.Lock()
+
+_wake = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _conn():
+    """One SQLite connection per thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CLEANUP_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_deletes ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, file_url TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, next_try REAL NOT NULL,"
+            " last_error TEXT NOT NULL DEFAULT '')"
+        )
+        _local.conn = conn
+    return conn
+
+
+def _count(name, n=1):
+    with _metrics_lock:
+        _metrics[name] += n
+
+
+# =====================================================
+#  ✅  Queue
+# =====================================================
+def enqueue(file_urls):
+    """
+    Queue Drive files for deletion.
+
+    Returns:
+        Number of URLs queued
+    """
+    file_urls = [u for u in file_urls if u]
+    if not file_urls:
+        return 0
+    now = time.time()
+    conn = _conn()
+    with conn:
+        conn.executemany(
+            "INSERT INTO pending_deletes (file_url, next_try) VALUES (?, ?)",
+            [(u, now) for u in file_urls],
+        )
+    _count("queued", len(file_urls))
+    _wake.set()
+    return len(file_urls)
+
+
+def stats():
+    """Counters since process start plus the current backlog size."""
+    with _metrics_lock:
+        result = dict(_metrics)
+    try:
+        result["pending"] = _conn().execute("SELECT COUNT(*) FROM pending_deletes").fetchone()[0]
+    except Exception as e:
+        print(f"Drive cleanup stats error: {e}")
+        result["pending"] = None
+    return result
+
+
+def _claim_due(conn):
+    """
+    Take the due entries for this worker: every gunicorn process runs
+    its own cleanup thread, and an entry handled twice would release
+    its upload_index reference twice.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")  # write lock: no other process claims in between
+    try:
+        due = conn.execute(
+            "SELECT id, file_url, attempts FROM pending_deletes WHERE next_try <= ? ORDER BY id LIMIT ?",
+            (now, CLEANUP_BATCH),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE pending_deletes SET next_try = ? WHERE id = ?",
+            [(now + CLEANUP_LEASE, entry_id) for entry_id, _, _ in due],
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return due
+
+
+def process_pending(delete_file):
+    """
+    Run one pass over the due entries.
+
+    Args:
+        delete_file: callable(file_url) that deletes the file and raises on failure
+    """
+    conn = _conn()
+    due = _claim_due(conn)
+    if not due:
+        return 0
+
+    def attempt(file_url):
+        try:
+            delete_file(file_url)
+            return None
+        except Exception as e:
+            return e
+
+    # Drive calls run in parallel; bookkeeping stays on this thread's connection
+    with ThreadPoolExecutor(max_workers=max(1, min(CLEANUP_WORKERS, len(due)))) as pool:
+        errors = list(pool.map(attempt, [file_url for _, file_url, _ in due]))
+
+    for (entry_id, file_url, attempts), e in zip(due, errors):
+        if e is None:
+            with conn:
+                conn.execute("DELETE FROM pending_deletes WHERE id = ?", (entry_id,))
+            _count("deleted")
+        else:
+            attempts += 1
+            with conn:
+                if attempts >= CLEANUP_MAX_ATTEMPTS:
+                    conn.execute("DELETE FROM pending_deletes WHERE id = ?", (entry_id,))
+                    _count("failed")
+                    print(f"Drive cleanup gave up on {file_url} after {attempts} attempts: {e}")
+                else:
+                    conn.execute(
+                        "UPDATE pending_deletes SET attempts = ?, next_try = ?, last_error = ? WHERE id = ?",
+                        (attempts, time.time() + min(600, 5 * 2 ** attempts), str(e), entry_id),
+                    )
+                    _count("retried")
+                    print(f"Drive cleanup retry {attempts} for {file_url}: {e}")
+    return len(due)
+
+
+# =====================================================
+#  ✅  Background worker
+# =====================================================
+def start_worker(delete_file):
+    """Start the cleanup thread once per process."""
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(
+            target=_cleanup_loop, args=(delete_file,), name="drive-cleanup", daemon=True
+        )
+        _worker.start()
+
+
+def _cleanup_loop(delete_file):
+    while True:
+        _wake.clear()
+        try:
+            # Keep going while full batches come back
+            while process_pending(delete_file) >= CLEANUP_BATCH:
+                pass
+        except Exception as e:
+            print(f"Drive cleanup error: {e}")
+        _wake.wait(CLEANUP_INTERVAL)
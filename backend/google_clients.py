@@ -0,0 +1,48 @@
+# backend/google_clients.py
+# ==========================================
+# Shared, lazily created Google Sheets client
+# ==========================================
+#
+# auth_service and sheets_service both talk to the same
+# spreadsheet with the same service account. One
+# authorized gspread client per process is built on first
+# use, so there is one token to refresh and one pool of
+# keep-alive TLS connections to sheets.googleapis.com.
+
+import os
+import json
+import threading
+
+import gspread
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+HTTP_POOL_SIZE = int(os.environ.get("GOOGLE_HTTP_POOL_SIZE", "16"))  # connections kept per host
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _service_account_credentials():
+    # ✅ Load Google credentials from environment (Render)
+    service_account_info = json.loads(os.environ["GOOGLE_CREDENTIALS"])
+    service_account_info["private_key"] = service_account_info["private_key"].replace("\\n", "\n")
+    return Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+
+
+def get_sheets_client():
+    """The process-wide authorized gspread client (created on first call)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = gspread.authorize(_service_account_credentials())
+                # Room for the worker threads / upload pool to share warm connections
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                client.http_client.session.mount("https://", adapter)
+                _client = client
+    return _client
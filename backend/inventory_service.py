@@ -0,0 +1,496 @@
+# backend/inventory_service.py
+# ==========================================
+# Materialized PPE inventory
+# ==========================================
+#
+# PPE_Stock is a restock ledger and PPE_Distribution_Log
+# grows with every issue, so summing both on each request
+# gets slower every week. Here the running totals per
+# (PPE_Type, Size) — plus distributed quantity per month —
+# are built once from the cached sheets and then kept up
+# to date by the HSE write endpoints.
+#
+# Writes that don't go through those hooks (generic edits
+# and deletes, manual edits in Google Sheets) are covered
+# by invalidate() and by a periodic full rebuild.
+#
+# The PPE_Stock rows used by hse_restock are located
+# through a (PPE_Type, Size) -> row index and adjusted
+# under a per-item lock (see adjust_stock). Issuing PPE
+# never touches PPE_Stock: every issue path checks the
+# running totals under the same locks (see Issuing PPE).
+
+import os
+import uuid
+import hashlib
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+try:
+    import fcntl  # cross-process locks (not available on Windows)
+except ImportError:
+    fcntl = None
+
+from gspread.utils import rowcol_to_a1
+
+from sheets_service import (
+    get_cached_records, get_versioned_records, get_current_time, get_schema,
+    invalidate_sheet_cache, reload_sheet_cache, cache_rows_appended, cache_row_updated,
+)
+
+INVENTORY_TTL = int(os.environ.get("INVENTORY_TTL", "300"))  # seconds between full rebuilds
+
+# (PPE_Type, Size) -> {"restocked", "distributed", "monthly": {"YYYY-MM": qty}}
+_totals = None
+_built_at = 0.0
+# Bumped by every incremental update, so a rebuild that read the
+# sheets before the update doesn't replace it with older totals.
+_generation = 0
+_lock = threading.Lock()
+
+_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y")
+
+
+def _key(row):
+    return str(row.get("PPE_Type", "")).strip(), str(row.get("Size", "")).strip()
+
+
+def _qty(value):
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    return int(number) if number.is_integer() else number
+
+
+def _month_of(value):
+    """'YYYY-MM' of a log Date, or None if it can't be read."""
+    text = str(value or "").strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m")
+        except ValueError:
+            continue
+    return None
+
+
+def _entry(totals, key):
+    return totals.setdefault(key, {"restocked": 0, "distributed": 0, "monthly": {}})
+
+
+def _add_restock(totals, key, quantity):
+    _entry(totals, key)["restocked"] += quantity
+
+
+def _add_distribution(totals, row, sign):
+    if not str(row.get("PPE_Type", "")).strip():
+        return
+    entry = _entry(totals, _key(row))
+    quantity = sign * _qty(row.get("Quantity"))
+    entry["distributed"] += quantity
+    month = _month_of(row.get("Date"))
+    if month:
+        entry["monthly"][month] = entry["monthly"].get(month, 0) + quantity
+
+
+# =====================================================
+#  ✅  Full build
+# =====================================================
+def _rebuild():
+    global _totals, _built_at
+    with _lock:
+        generation = _generation
+
+    totals = {}
+    for row in get_cached_records("PPE_Stock"):
+        if str(row.get("PPE_Type", "")).strip():
+            _add_restock(totals, _key(row), _qty(row.get("Quantity")))
+    for row in get_cached_records("PPE_Distribution_Log"):
+        _add_distribution(totals, row, 1)
+
+    with _lock:
+        _totals = totals
+        # An update landed meanwhile: serve these totals, but rebuild next time
+        _built_at = time.time() if generation == _generation else 0.0
+        return totals
+
+
+# =====================================================
+#  ✅  Incremental updates (after the sheet write succeeded)
+# =====================================================
+def record_restock(ppe_type, size, quantity):
+    """Stock added (or removed, with a negative quantity) for one type/size."""
+    global _generation
+    with _lock:
+        _generation += 1
+        if _totals is not None:
+            _add_restock(_totals, (str(ppe_type).strip(), str(size).strip()), _qty(quantity))
+
+
+def record_distribution(row, sign=1):
+    """A PPE_Distribution_Log row was added (sign=1) or removed (sign=-1)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        if _totals is not None:
+            _add_distribution(_totals, row, sign)
+
+
+def invalidate():
+    """Rebuild on the next read (for writes the hooks above don't see)."""
+    global _built_at, _generation
+    with _lock:
+        _generation += 1
+        _built_at = 0.0
+
+
+# =====================================================
+#  ✅  Read
+# =====================================================
+def _snapshot():
+    """Copy of the running totals, rebuilt first if they are missing or expired."""
+    with _lock:
+        totals = _totals if _totals is not None and time.time() - _built_at < INVENTORY_TTL else None
+        if totals is not None:
+            return {k: dict(v, monthly=dict(v["monthly"])) for k, v in totals.items()}
+    totals = _rebuild()
+    with _lock:
+        return {k: dict(v, monthly=dict(v["monthly"])) for k, v in totals.items()}
+
+
+def get_inventory():
+    """
+    Returns:
+        {"month": "YYYY-MM", "items": [{PPE_Type, Size, restocked,
+        distributed, available, distributed_this_month, monthly}]}
+    """
+    totals = _snapshot()
+
+    month = get_current_time()[:7]
+    items = [
+        {
+            "PPE_Type": ppe_type,
+            "Size": size,
+            "restocked": data["restocked"],
+            "distributed": data["distributed"],
+            "available": data["restocked"] - data["distributed"],
+            "distributed_this_month": data["monthly"].get(month, 0),
+            "monthly": data["monthly"],
+        }
+        for (ppe_type, size), data in sorted(totals.items())
+    ]
+    return {"month": month, "items": items}
+
+
+# =====================================================
+#  ✅  PPE_Stock: keyed row index
+#
+#  (PPE_Type, Size) -> row number, rebuilt from the cached
+#  sheet whenever its version changes (in memory, no API
+#  call).
+# =====================================================
+_stock_index = {"version": None, "rows": {}}
+_stock_index_lock = threading.Lock()
+
+
+def _stock_row_index(ppe_type, size):
+    records, version = get_versioned_records("PPE_Stock")
+    with _stock_index_lock:
+        if _stock_index["version"] != version:
+            rows = {}
+            for idx, row in enumerate(records, start=2):
+                rows.setdefault(_key(row), idx)
+            _stock_index.update(version=version, rows=rows)
+        return _stock_index["rows"].get((ppe_type, size))
+
+
+def _read_stock_row(schema, ppe_type, size):
+    """
+    Find a stock row and read it fresh from the sheet.
+
+    Returns:
+        (row_index, row_dict) or (None, None) if the item doesn't exist
+    """
+    sheet = schema["worksheet"]
+    headers = schema["headers"]
+    for attempt in range(2):
+        idx = _stock_row_index(ppe_type, size)
+        if idx is not None:
+            existing = sheet.row_values(idx)
+            existing += [""] * (len(headers) - len(existing))
+            fresh = dict(zip(headers, existing))
+            if _key(fresh) == (ppe_type, size):
+                return idx, fresh
+        if attempt == 0:
+            # Rows moved (or the item was added elsewhere) — index a fresh copy
+            invalidate_sheet_cache("PPE_Stock")
+    return None, None
+
+
+# =====================================================
+#  ✅  PPE_Stock: per-item locks
+#
+#  A thread lock serializes requests inside one process;
+#  an flock()ed file serializes them across the gunicorn
+#  workers of this host. The file also holds a mark that
+#  a holder renews after restocking or issuing the item,
+#  so a worker can tell its running totals are missing
+#  another worker's writes.
+# =====================================================
+STOCK_LOCK_DIR = os.environ.get("STOCK_LOCK_DIR", os.path.join(tempfile.gettempdir(), "ppe_stock_locks"))
+
+_item_locks = {}
+_item_locks_guard = threading.Lock()
+_seen_marks = {}  # lock key -> mark this process last saw or wrote
+
+
+@contextmanager
+def stock_lock(ppe_type, size):
+    """
+    Yields {"stale", "changed"}: "stale" is True if another process
+    changed the item since this one last held the lock (see
+    _refresh_if_stale); set "changed" once the item was written.
+    """
+    key = f"{ppe_type}\x00{size}"
+    with _item_locks_guard:
+        lock = _item_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        state = {"stale": False, "changed": False}
+        if fcntl is None:
+            yield state
+            return
+        os.makedirs(STOCK_LOCK_DIR, exist_ok=True)
+        path = os.path.join(STOCK_LOCK_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+        with open(path, "a+") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                mark = handle.read().strip()
+                state["stale"] = bool(mark) and mark != _seen_marks.get(key)
+                yield state
+                _seen_marks[key] = mark
+            finally:
+                if state["changed"]:
+                    mark = uuid.uuid4().hex
+                    handle.seek(0)
+                    handle.truncate()
+                    handle.write(mark)
+                    handle.flush()
+                    _seen_marks[key] = mark
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _refresh_if_stale(states):
+    """Re-read the PPE sheets if another worker changed one of the locked items."""
+    if any(state["stale"] for state in states):
+        reload_sheet_cache("PPE_Stock")
+        reload_sheet_cache("PPE_Distribution_Log")
+        invalidate()
+
+
+# =====================================================
+#  ✅  PPE_Stock: adjust a quantity
+# =====================================================
+def adjust_stock(ppe_type, size, delta, added_by=None, create=False):
+    """
+    Add `delta` (negative to take stock out) to one PPE type/size.
+
+    The row is re-read and written back under stock_lock, and only the
+    changed cells are written (one batch call), so concurrent
+    adjustments can't overwrite each other.
+
+    Args:
+        create: add a new row if the item has no stock row yet
+
+    Returns:
+        {"status": "success", "new_quantity", "action": "updated"/"created"}
+        or {"status": "error", "message"} if the item is missing or there
+        isn't enough stock
+    """
+    ppe_type, size = str(ppe_type).strip(), str(size).strip()
+    schema = get_schema("PPE_Stock")
+    sheet = schema["worksheet"]
+    headers = schema["headers"]
+
+    with stock_lock(ppe_type, size) as lock_state:
+        _refresh_if_stale([lock_state])
+        current_time = get_current_time()
+        idx, row = _read_stock_row(schema, ppe_type, size)
+
+        if idx is None:
+            if not create:
+                label = ppe_type + (f" size {size}" if size else "")
+                return {"status": "error", "message": f"No stock found for {label}. Please add stock first."}
+            new_row = {h: "" for h in headers}
+            new_row.update(PPE_Type=ppe_type, Size=size, Quantity=delta, Last_Updated=current_time)
+            if added_by is not None:
+                new_row["Added_by"] = added_by
+            values = [new_row.get(h, "") for h in headers]
+            response = sheet.append_row(values)
+            lock_state["changed"] = True
+            cache_rows_appended("PPE_Stock", headers, [values], response)
+            record_restock(ppe_type, size, delta)
+            return {"status": "success", "new_quantity": delta, "action": "created"}
+
+        current_qty = int(_qty(row.get("Quantity")))
+        new_qty = current_qty + delta
+        if new_qty < 0:
+            return {"status": "error", "message": f"Not enough stock. Only {current_qty} available."}
+
+        changes = {"Quantity": new_qty, "Last_Updated": current_time}
+        if added_by is not None:
+            changes["Added_by"] = added_by
+        sheet.batch_update([
+            {"range": rowcol_to_a1(idx, headers.index(col) + 1), "values": [[value]]}
+            for col, value in changes.items() if col in headers
+        ])
+        lock_state["changed"] = True
+        row.update(changes)
+        cache_row_updated("PPE_Stock", idx, headers, [row.get(h, "") for h in headers])
+        record_restock(ppe_type, size, delta)
+        return {"status": "success", "new_quantity": new_qty, "action": "updated"}
+
+
+# =====================================================
+#  ✅  Issuing PPE
+#
+#  PPE_Stock is a restock ledger: issuing PPE only adds
+#  PPE_Distribution_Log rows, and what is available is
+#  restocked − distributed per (PPE_Type, Size). Every
+#  issue path (single, bulk and the generic add) checks
+#  the running totals under the items' stock locks.
+# =====================================================
+@contextmanager
+def _issuing(keys):
+    """
+    Hold the stock locks of several items and yield (available, lock
+    states): available maps each key to its quantity, or None if the
+    item was never restocked.
+    """
+    keys = sorted(set(keys))
+    with ExitStack() as locks:
+        # Always taken in the same (sorted) order, so two requests can't deadlock
+        states = {key: locks.enter_context(stock_lock(*key)) for key in keys}
+        _refresh_if_stale(states.values())
+        totals = _snapshot()
+        available = {}
+        for key in keys:
+            entry = totals.get(key)
+            available[key] = entry["restocked"] - entry["distributed"] if entry and entry["restocked"] else None
+        yield available, states
+
+
+def _issue_error(key, quantity, available):
+    if available is None:
+        label = key[0] + (f" size {key[1]}" if key[1] else "")
+        return f"No stock found for {label}. Please add stock first."
+    if available < quantity:
+        return f"Not enough stock. Only {available} available."
+    return None
+
+
+def distribute_bulk(lines, given_by):
+    """
+    Issue several PPE items at once (/api/hse/distribute sends one line).
+
+    Every line is checked against what is left after the lines before
+    it, then all log rows go out in one append.
+
+    Args:
+        lines: [{PPE_Type, Size, Quantity, Worker_Name, Worker_Position, Notes}]
+        given_by: recorded in the log's Given_By column
+
+    Returns:
+        One result per line, in order: {"line", "status": "success",
+        "remaining_stock"} or {"line", "status": "error", "message"}
+    """
+    results = [None] * len(lines)
+    accepted = []  # (line number, key, quantity, log row)
+
+    for n, line in enumerate(lines):
+        if not isinstance(line, dict):
+            results[n] = {"line": n, "status": "error", "message": "Invalid line"}
+            continue
+        ppe_type = str(line.get("PPE_Type", "")).strip()
+        size = str(line.get("Size", "")).strip()
+        worker_name = str(line.get("Worker_Name", "")).strip()
+        try:
+            quantity = int(line.get("Quantity", 1))
+        except (ValueError, TypeError):
+            results[n] = {"line": n, "status": "error", "message": "Invalid quantity"}
+            continue
+        if not ppe_type or not worker_name or quantity <= 0:
+            results[n] = {"line": n, "status": "error",
+                          "message": "PPE type, worker name, and positive quantity are required"}
+            continue
+        log_row = {
+            "Worker_Name": worker_name,
+            "Worker_Position": str(line.get("Worker_Position", "")).strip(),
+            "PPE_Type": ppe_type,
+            "Size": size,
+            "Quantity": quantity,
+            "Given_By": given_by,
+            "Notes": str(line.get("Notes", "")).strip(),
+        }
+        accepted.append((n, (ppe_type, size), quantity, log_row))
+
+    if not accepted:
+        return results
+
+    log_schema = get_schema("PPE_Distribution_Log")
+    log_headers = log_schema["headers"]
+
+    with _issuing(key for _, key, _, _ in accepted) as (remaining, states):
+        current_time = get_current_time()
+        issued = []
+        for n, key, quantity, log_row in accepted:
+            error = _issue_error(key, quantity, remaining[key])
+            if error:
+                results[n] = {"line": n, "status": "error", "message": error}
+            else:
+                remaining[key] -= quantity
+                log_row["Date"] = current_time
+                issued.append((n, key, log_row))
+
+        if not issued:
+            return results
+
+        # --- One append for all log rows ---
+        log_values = [[log_row.get(h, "") for h in log_headers] for _, _, log_row in issued]
+        response = log_schema["worksheet"].append_rows(log_values)
+        for _, key, log_row in issued:
+            states[key]["changed"] = True
+            record_distribution(log_row)
+        cache_rows_appended("PPE_Distribution_Log", log_headers, log_values, response)
+
+    # Remaining stock per line is the value after the whole batch
+    for n, key, log_row in issued:
+        results[n] = {"line": n, "status": "success", "remaining_stock": remaining[key]}
+    return results
+
+
+def add_distribution(new_row, append):
+    """
+    /api/add/PPE_Distribution_Log: a log row built by the client, held
+    to the same availability rule as distribute_bulk.
+
+    Args:
+        append: callable(new_row) that writes the row (sheets_service.append_row)
+    """
+    key = _key(new_row)
+    quantity = _qty(new_row.get("Quantity"))
+    with _issuing([key]) as (available, states):
+        if key[0] and quantity > 0:
+            error = _issue_error(key, quantity, available[key])
+            if error:
+                return {"status": "error", "message": error}
+        result = append(new_row)
+        if result.get("status") == "success":
+            states[key]["changed"] = True
+            # Queued rows count as issued too, so the next request can't oversell them
+            record_distribution(new_row)
+        return result
@@ -0,0 +1,311 @@
+# backend/mirror_service.py
+# ==========================================
+# Local SQLite read mirror of the spreadsheet
+# (optional — enable with SHEETS_MIRROR=1)
+# ==========================================
+#
+# A background thread keeps a copy of every sheet in a
+# local SQLite file: one full load when it starts, then
+# a periodic refresh that only rewrites the rows that
+# actually changed. Our own writes are applied to the
+# mirror right after they succeed on Google, so reads
+# never have to wait on the Sheets API.
+#
+# The file is shared by all gunicorn workers of the host
+# and only one of them (the one holding the leader lock)
+# runs the sync; the others just read it. Every run of a
+# leader has its own id, and a sheet is only trusted once
+# it was stored during the current run, so a file left
+# over from a previous run isn't served until refreshed.
+#
+# Users is never mirrored: it holds the passwords.
+#
+# This module only stores rows; sheets_service decides
+# what to fetch and when to read from here.
+
+import os
+import json
+import uuid
+import sqlite3
+import hashlib
+import threading
+
+try:
+    import fcntl  # leader lock (not available on Windows)
+except ImportError:
+    fcntl = None
+
+MIRROR_ENABLED = os.environ.get("SHEETS_MIRROR", "").lower() in ("1", "true", "yes")
+MIRROR_PATH = os.environ.get(
+    "SHEETS_MIRROR_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sheets_mirror.db")
+)
+MIRROR_SYNC_INTERVAL = int(os.environ.get("SHEETS_MIRROR_INTERVAL", "30"))  # seconds
+MIRROR_EXCLUDED_SHEETS = ("Users",)
+
+_local = threading.local()
+
+_wake = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+_leader_handle = None  # open leader lock file, held for the life of the process
+
+
+def _conn():
+    """One SQLite connection per thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(MIRROR_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sheet_rows ("
+            " sheet TEXT NOT NULL, rowindex INTEGER NOT NULL, data TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sheet_rows ON sheet_rows (sheet, rowindex)")
+        # generation: bumped on every local write so a sync that started
+        # before the write doesn't overwrite it with older data.
+        # run: the leader run the sheet was last stored in.
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sheet_state ("
+            " sheet TEXT PRIMARY KEY, hash TEXT NOT NULL DEFAULT '',"
+            " generation INTEGER NOT NULL DEFAULT 0, run TEXT NOT NULL DEFAULT '')"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS mirror_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS sheet_meta")  # per-process state of older versions
+            conn.executemany(
+                "DELETE FROM sheet_rows WHERE sheet = ?", [(name,) for name in MIRROR_EXCLUDED_SHEETS]
+            )
+        _local.conn = conn
+    return conn
+
+
+def _encode(record):
+    return json.dumps(record, sort_keys=True, default=str)
+
+
+def mirrors(sheet_name):
+    return MIRROR_ENABLED and sheet_name not in MIRROR_EXCLUDED_SHEETS
+
+
+def _run(conn):
+    row = conn.execute("SELECT value FROM mirror_meta WHERE key = 'run'").fetchone()
+    return row[0] if row else ""
+
+
+def _state(conn, sheet_name):
+    conn.execute("INSERT OR IGNORE INTO sheet_state (sheet) VALUES (?)", (sheet_name,))
+
+
+def generation(sheet_name):
+    row = _conn().execute("SELECT generation FROM sheet_state WHERE sheet = ?", (sheet_name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _generations():
+    return dict(_conn().execute("SELECT sheet, generation FROM sheet_state"))
+
+
+# =====================================================
+#  ✅  Reads
+# =====================================================
+def load_rows(sheet_name):
+    """
+    Return the mirrored records of a sheet (ordered by row), or None
+    when the mirror can't be trusted for it yet.
+    """
+    if not mirrors(sheet_name):
+        return None
+    try:
+        conn = _conn()
+        fresh = conn.execute(
+            "SELECT 1 FROM sheet_state s JOIN mirror_meta m ON m.key = 'run'"
+            " WHERE s.sheet = ? AND s.run = m.value",
+            (sheet_name,),
+        ).fetchone()
+        if not fresh:
+            return None
+        cursor = conn.execute(
+            "SELECT data FROM sheet_rows WHERE sheet = ? ORDER BY rowindex", (sheet_name,)
+        )
+        return [json.loads(data) for (data,) in cursor]
+    except Exception as e:
+        print(f"Mirror read error ({sheet_name}): {e}")
+        return None
+
+
+# =====================================================
+#  ✅  Full / incremental refresh
+# =====================================================
+def store_rows(sheet_name, rows, expected_generation=None):
+    """
+    Bring the mirror of a sheet in line with `rows`, writing only the
+    rows that differ. Skipped if a local write happened since
+    `expected_generation` was read.
+
+    Returns:
+        True if the mirrored content changed, False otherwise
+    """
+    if not mirrors(sheet_name):
+        return False
+    encoded = [_encode(r) for r in rows]
+    digest = hashlib.sha1("\n".join(encoded).encode("utf-8")).hexdigest()
+
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")  # no other worker writes the sheet in between
+    try:
+        _state(conn, sheet_name)
+        known, current = conn.execute(
+            "SELECT hash, generation FROM sheet_state WHERE sheet = ?", (sheet_name,)
+        ).fetchone()
+        if expected_generation is not None and current != expected_generation:
+            conn.rollback()
+            return False
+        changed = known != digest
+        if changed:
+            existing = dict(conn.execute(
+                "SELECT rowindex, data FROM sheet_rows WHERE sheet = ?", (sheet_name,)
+            ))
+            inserts, updates = [], []
+            for rowindex, data in enumerate(encoded, start=2):
+                old = existing.get(rowindex)
+                if old is None:
+                    inserts.append((sheet_name, rowindex, data))
+                elif old != data:
+                    updates.append((data, sheet_name, rowindex))
+            conn.executemany("UPDATE sheet_rows SET data = ? WHERE sheet = ? AND rowindex = ?", updates)
+            conn.executemany("INSERT INTO sheet_rows (sheet, rowindex, data) VALUES (?, ?, ?)", inserts)
+            conn.execute(
+                "DELETE FROM sheet_rows WHERE sheet = ? AND rowindex > ?", (sheet_name, len(rows) + 1)
+            )
+        conn.execute(
+            "UPDATE sheet_state SET hash = ?, run = ? WHERE sheet = ?", (digest, _run(conn), sheet_name)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return changed
+
+
+# =====================================================
+#  ✅  Row-level writes (after Google accepted them)
+# =====================================================
+def _apply(sheet_name, statements):
+    if not mirrors(sheet_name):
+        return
+    try:
+        conn = _conn()
+        with conn:
+            _state(conn, sheet_name)
+            for sql, args in statements:
+                conn.execute(sql, args)
+            # Content no longer matches the stored hash; next sync diffs it
+            conn.execute(
+                "UPDATE sheet_state SET hash = '', generation = generation + 1 WHERE sheet = ?", (sheet_name,)
+            )
+    except Exception as e:
+        print(f"Mirror write error ({sheet_name}): {e}")
+        mark_stale(sheet_name)
+
+
+def apply_append(sheet_name, rowindex, record):
+    _apply(sheet_name, [
+        ("DELETE FROM sheet_rows WHERE sheet = ? AND rowindex = ?", (sheet_name, rowindex)),
+        ("INSERT INTO sheet_rows (sheet, rowindex, data) VALUES (?, ?, ?)", (sheet_name, rowindex, _encode(record))),
+    ])
+
+
+def apply_update(sheet_name, rowindex, record):
+    _apply(sheet_name, [
+        ("UPDATE sheet_rows SET data = ? WHERE sheet = ? AND rowindex = ?", (_encode(record), sheet_name, rowindex)),
+    ])
+
+
+def apply_delete(sheet_name, rowindex):
+    _apply(sheet_name, [
+        ("DELETE FROM sheet_rows WHERE sheet = ? AND rowindex = ?", (sheet_name, rowindex)),
+        ("UPDATE sheet_rows SET rowindex = rowindex - 1 WHERE sheet = ? AND rowindex > ?", (sheet_name, rowindex)),
+    ])
+
+
+def mark_stale(sheet_name):
+    """Stop serving a sheet from the mirror until it is resynced."""
+    if not mirrors(sheet_name):
+        return
+    try:
+        conn = _conn()
+        with conn:
+            _state(conn, sheet_name)
+            conn.execute(
+                "UPDATE sheet_state SET run = '', generation = generation + 1 WHERE sheet = ?", (sheet_name,)
+            )
+    except Exception as e:
+        print(f"Mirror write error ({sheet_name}): {e}")
+    _wake.set()
+
+
+# =====================================================
+#  ✅  Background sync worker
+# =====================================================
+def start_sync_worker(fetch_all, on_changed):
+    """
+    Start the sync thread once per process; it only syncs while this
+    process is the leader.
+
+    Args:
+        fetch_all: callable returning {sheet_name: records} for all sheets
+        on_changed: callable(sheet_name, records) for sheets whose content changed
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(
+            target=_sync_loop, args=(fetch_all, on_changed), name="sheets-mirror-sync", daemon=True
+        )
+        _worker.start()
+
+
+def _lead():
+    """Try to become the process that syncs; starts a new run if so."""
+    global _leader_handle
+    if _leader_handle is not None:
+        return True
+    handle = open(MIRROR_PATH + ".lock", "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO mirror_meta (key, value) VALUES ('run', ?)", (uuid.uuid4().hex,)
+        )
+    _leader_handle = handle
+    return True
+
+
+def _sync_loop(fetch_all, on_changed):
+    # Another worker syncs; try again now and then in case it exits
+    while True:
+        try:
+            if _lead():
+                break
+        except Exception as e:
+            print(f"Mirror leader error: {e}")
+        _wake.wait(MIRROR_SYNC_INTERVAL)
+        _wake.clear()
+
+    while True:
+        _wake.clear()
+        try:
+            generations = _generations()
+            for sheet_name, rows in fetch_all().items():
+                if store_rows(sheet_name, rows, expected_generation=generations.get(sheet_name, 0)):
+                    on_changed(sheet_name, rows)
+        except Exception as e:
+            print(f"Mirror sync error: {e}")
+        _wake.wait(MIRROR_SYNC_INTERVAL)
@@ -98,3 +98,23 @@ SHEET_PERMISSIONS = {
         "delete": [ROLES["SUPERVISOR"], ROLES["ADMIN"]],
     },
 }
+
+
+# -------------------------
+# Compiled lookup (built once at import):
+# role -> frozenset of (sheet, action)
+# -------------------------
+def compile_role_permissions(sheet_permissions):
+    grants = {}
+    for sheet_name, actions in sheet_permissions.items():
+        for action, roles in actions.items():
+            for role in roles:
+                grants.setdefault(role, set()).add((sheet_name, action))
+    return {role: frozenset(pairs) for role, pairs in grants.items()}
+
+
+ROLE_PERMISSIONS = compile_role_permissions(SHEET_PERMISSIONS)
+
+
+def is_allowed(role, sheet_name, action):
+    return (sheet_name, action) in ROLE_PERMISSIONS.get(role, frozenset())
@@ -0,0 +1,79 @@
+# backend/reference_data.py
+# ==========================================
+# Cached reference sheets (dropdown / lookup data)
+# ==========================================
+#
+# Machinery_Types changes rarely but is looked up on every
+# Suivi write and machinery dropdown render. It is turned
+# once into the lookup dicts its callers need and kept for
+# REFERENCE_TTL seconds, or until invalidate() is called
+# after an edit through the API. Add a builder here when
+# another reference sheet gets a server-side lookup.
+
+import os
+import threading
+import time
+
+from sheets_service import get_cached_records
+
+REFERENCE_TTL = int(os.environ.get("REFERENCE_TTL", "3600"))  # seconds
+
+
+def _build_machinery_types(records):
+    equipment_types = {}
+    dropdown = []
+    for row in records:
+        english = row.get("English", "")
+        mapping = row.get("Equipment_Type_Mapping", "")
+        if english and mapping:
+            equipment_types[english] = mapping
+        if english:
+            dropdown.append({
+                "english": english,
+                "arabic": row.get("Arabic", ""),
+                "mapping": mapping
+            })
+    return {"equipment_types": equipment_types, "dropdown": dropdown}
+
+
+_BUILDERS = {
+    "Machinery_Types": _build_machinery_types,
+}
+REFERENCE_SHEETS = tuple(_BUILDERS)
+
+_entries = {}  # sheet_name -> (built data, built_at)
+_lock = threading.Lock()
+
+
+def _get(sheet_name):
+    # Held while building so an invalidate() can't be overwritten by a build that read older rows
+    with _lock:
+        entry = _entries.get(sheet_name)
+        if entry is not None and time.monotonic() - entry[1] <= REFERENCE_TTL:
+            return entry[0]
+        data = _BUILDERS[sheet_name](get_cached_records(sheet_name))
+        _entries[sheet_name] = (data, time.monotonic())
+        return data
+
+
+def invalidate(sheet_name=None):
+    """Rebuild on next use — call after a reference sheet was edited."""
+    with _lock:
+        if sheet_name is None:
+            _entries.clear()
+        else:
+            _entries.pop(sheet_name, None)
+
+
+# =====================================================
+#  ✅  Lookups (treat results as read-only)
+# =====================================================
+def machinery_equipment_types():
+    """Machinery name (English) -> Equipment Type, for Suivi rows."""
+    return _get("Machinery_Types")["equipment_types"]
+
+
+def machinery_types_dropdown():
+    """[{english, arabic, mapping}] for the machinery dropdown."""
+    return _get("Machinery_Types")["dropdown"]
+
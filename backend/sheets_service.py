@@ -1,16 +1,38 @@
 import os
 import json
+import atexit
 import base64
 import io
 import pickle
-import gspread
+import queue
+import re
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gspread.utils import numericise_all, rowcol_to_a1
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseUpload
-from google.oauth2.service_account import Credentials
 from google.auth.transport.requests import Request
-from flask import jsonify
+from flask import Response, jsonify, request
+from werkzeug.datastructures import FileStorage
 from datetime import datetime
 import pytz
+from PIL import Image, ImageOps
+
+import mirror_service
+import version_log
+import upload_index
+import append_queue
+import drive_cleanup
+from permissions import SHEET_PERMISSIONS
+from google_clients import get_sheets_client
 
 # =====================================================
 #  ✅  Load Google OAuth Token (from environment variable)
@@ -40,23 +62,39 @@ if creds and creds.expired and creds.refresh_token:
     except Exception as e:
         print(f"Error refreshing token: {e}")
 
-# Build Drive service (OAuth)
-drive_service = build("drive", "v3", credentials=creds)
-
 # =====================================================
-#  ✅  Google Sheets access (still uses service account)
+#  ✅  Drive client pool
+#
+#  httplib2 (under googleapiclient) is not thread-safe,
+#  so a service object is never used by two threads at
+#  once: drive_client() lends one out of a pool and takes
+#  it back afterwards. Each keeps its own keep-alive
+#  connection, and services are built from the discovery
+#  document bundled with the library (no network call).
 # =====================================================
-service_account_info = json.loads(os.environ["GOOGLE_CREDENTIALS"])
-service_account_info["private_key"] = service_account_info["private_key"].replace("\\\\n", "\\n")
+DRIVE_POOL_SIZE = int(os.environ.get("DRIVE_POOL_SIZE", "8"))  # idle services kept
+DRIVE_HTTP_TIMEOUT = int(os.environ.get("DRIVE_HTTP_TIMEOUT", "120"))  # seconds
 
-sheet_creds = Credentials.from_service_account_info(
-    service_account_info,
-    scopes=[
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-)
-client = gspread.authorize(sheet_creds)
+_drive_pool = queue.LifoQueue()
+
+
+def _build_drive_service():
+    http = AuthorizedHttp(creds, http=httplib2.Http(timeout=DRIVE_HTTP_TIMEOUT))
+    return build("drive", "v3", http=http, static_discovery=True, cache_discovery=False)
+
+
+@contextmanager
+def drive_client():
+    """Borrow a Drive service for the duration of the block."""
+    try:
+        service = _drive_pool.get_nowait()
+    except queue.Empty:
+        service = _build_drive_service()
+    try:
+        yield service
+    finally:
+        if _drive_pool.qsize() < DRIVE_POOL_SIZE:
+            _drive_pool.put(service)
 
 # =====================================================
 #  ✅  Your Google Sheet ID and Drive Folders
@@ -66,6 +104,92 @@ FOLDER_A_ID = "1LXuX4GDaIPsnc0F5yizlL5znfMl22RnD"  # Main photo folder
 FOLDERAID_MACHINERY_DOCS = '1NPywJrjTCvobQetVqoGg7V4AbhLcfAXf'  # Machinery Documents folder
 FOLDERAID_OPERATORS = '1PRg64C-cG7s1ok31BCaUybJwY68O2t3u'  # Operators folder
 
+# =====================================================
+#  ✅  Worksheet handle & header schema registry
+# =====================================================
+SCHEMA_TTL = int(os.environ.get("SCHEMA_TTL", "600"))  # seconds
+
+_spreadsheet = None
+# sheet_name -> {"worksheet", "headers", "col_count", "last_col", "loaded_at"}
+_schemas = {}
+_schema_lock = threading.Lock()
+
+
+def get_spreadsheet():
+    """
+    Open the spreadsheet once per process and reuse the handle.
+    The authorized client is shared with auth_service — see google_clients.
+    """
+    global _spreadsheet
+    with _schema_lock:
+        if _spreadsheet is None:
+            _spreadsheet = get_sheets_client().open_by_key(SPREADSHEET_ID)
+        return _spreadsheet
+
+
+def column_letter(col_count):
+    """1 -> 'A', 26 -> 'Z', 27 -> 'AA' (never less than 'A')."""
+    return rowcol_to_a1(1, max(col_count, 1)).rstrip("0123456789")
+
+
+def get_schema(sheet_name):
+    """
+    Return the cached worksheet handle and header layout for a sheet,
+    loading it (one metadata call + one header read) on first use.
+    """
+    with _schema_lock:
+        schema = _schemas.get(sheet_name)
+    if schema and time.monotonic() - schema["loaded_at"] <= SCHEMA_TTL:
+        return schema
+
+    worksheet = get_spreadsheet().worksheet(sheet_name)
+    headers = worksheet.row_values(1)
+    schema = {
+        "worksheet": worksheet,
+        "headers": headers,
+        "col_count": len(headers),
+        "last_col": column_letter(len(headers)),
+        "loaded_at": time.monotonic(),
+    }
+    with _schema_lock:
+        _schemas[sheet_name] = schema
+    return schema
+
+
+def get_worksheet(sheet_name):
+    return get_schema(sheet_name)["worksheet"]
+
+
+def row_range(schema, row_index):
+    """A1 range covering one full row of the sheet, e.g. 'A5:N5'."""
+    return f"A{row_index}:{schema['last_col']}{row_index}"
+
+
+def invalidate_schema(sheet_name=None):
+    """Forget a worksheet's handle/headers (or all of them) so they are reloaded."""
+    global _spreadsheet
+    with _schema_lock:
+        if sheet_name is None:
+            _schemas.clear()
+            _spreadsheet = None
+        else:
+            _schemas.pop(sheet_name, None)
+
+
+def _check_schema(sheet_name, records):
+    """Refresh the registry when fetched records show different headers."""
+    if not records:
+        return
+    with _schema_lock:
+        schema = _schemas.get(sheet_name)
+    if schema is None:
+        return
+    seen = [k for k in records[0].keys() if k]
+    known = [h for h in schema["headers"] if h]
+    if seen != known:
+        print(f"🔄 Header change detected on {sheet_name}, refreshing schema")
+        invalidate_schema(sheet_name)
+
 # =====================================================
 #  ✅  Utility: Current Algeria Time
 # =====================================================
@@ -74,61 +198,1045 @@ def get_current_time():
     return datetime.now(algeria_tz).strftime("%Y-%m-%d %H:%M:%S")
 
 # =====================================================
-#  ✅  Utility: Upload Base64 image to Google Drive
+#  ✅  In-process sheet cache (per worksheet, TTL + LRU)
+# =====================================================
+SHEET_CACHE_TTL = int(os.environ.get("SHEET_CACHE_TTL", "60"))  # seconds
+SHEET_CACHE_MAX_SHEETS = int(os.environ.get("SHEET_CACHE_MAX_SHEETS", "16"))
+SHEET_FETCH_ATTEMPTS = 3  # re-reads when a write lands during a fetch
+
+# sheet_name -> {"rows": [record dicts, no rowindex], "version": int, "fetched_at": monotonic ts}
+_sheet_cache = OrderedDict()
+_sheet_cache_lock = threading.Lock()
+
+# =====================================================
+#  ✅  Worksheet versions & change log (ETag / delta sync)
+#
+#  Every worksheet has a version number that moves
+#  forward whenever its content changes. Our own
+#  single-row writes are logged with a snapshot of the
+#  row so clients can ask "what changed since v?".
+#  Anything we can't describe row by row (multi-row
+#  writes, changes made directly in Google Sheets)
+#  is logged as a "reset" and forces a full reload.
+#  Versions and the log are shared by all workers (see
+#  version_log.py); each worker's cached copy records
+#  the version it is at and replays the rows another
+#  worker logged before it is served.
+# =====================================================
+def _records_hash(rows):
+    return hashlib.sha1(json.dumps(rows, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def format_version(version):
+    return f"{version_log.epoch()}.{version}"
+
+
+def _catch_up(sheet_name, entry):
+    """
+    Replay the changes other workers logged onto a cached copy.
+    Caller must hold _sheet_cache_lock.
+
+    Returns:
+        False if they can't be replayed (the copy must be dropped)
+    """
+    version, _ = version_log.current(sheet_name)
+    if version == entry["version"]:
+        return True
+    changes = version_log.changes_since(sheet_name, entry["version"])
+    if changes is None:
+        return False
+    rows = list(entry["rows"])
+    for _, op, rowindex, record in changes:
+        pos = (rowindex or 0) - 2
+        if op == "add" and pos == len(rows):
+            rows.append(record)
+        elif op == "update" and 0 <= pos < len(rows):
+            rows[pos] = record
+        elif op == "delete" and 0 <= pos < len(rows):
+            del rows[pos]
+        else:
+            return False
+    entry.update(rows=rows, version=version)
+    return True
+
+
+def _cache_lookup(sheet_name):
+    """Return (rows, version) for a worksheet if still fresh, else None."""
+    with _sheet_cache_lock:
+        entry = _sheet_cache.get(sheet_name)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["fetched_at"] > SHEET_CACHE_TTL or not _catch_up(sheet_name, entry):
+            del _sheet_cache[sheet_name]
+            return None
+        _sheet_cache.move_to_end(sheet_name)
+        return entry["rows"], entry["version"]
+
+
+def _cache_version(sheet_name):
+    return version_log.current(sheet_name)[0]
+
+
+def _cache_store(sheet_name, rows, expected_version=None):
+    """
+    Cache freshly fetched rows; bumps the version if the content changed.
+
+    Returns:
+        the sheet version, or None (nothing stored) if a write happened
+        since `expected_version` was read — the rows may predate it
+    """
+    digest = _records_hash(rows)
+    with _sheet_cache_lock:
+        # A different hash means the sheet changed outside of the app
+        # (or by a write we couldn't track): logged as a reset
+        version = version_log.store_hash(sheet_name, digest, expected=expected_version)
+        if version is None:
+            return None
+
+        _sheet_cache[sheet_name] = {"rows": rows, "version": version, "fetched_at": time.monotonic()}
+        _sheet_cache.move_to_end(sheet_name)
+        while len(_sheet_cache) > SHEET_CACHE_MAX_SHEETS:
+            _sheet_cache.popitem(last=False)
+        return version
+
+
+def invalidate_sheet_cache(sheet_name=None):
+    """Drop one worksheet (or everything) from the read cache after a write."""
+    with _sheet_cache_lock:
+        names = set(version_log.sheets()) | set(_sheet_cache) if sheet_name is None else [sheet_name]
+        for name in names:
+            _cache_reset(name)
+
+
+def reload_sheet_cache(sheet_name):
+    """
+    Re-read a worksheet now (e.g. another process wrote to it). Unlike
+    invalidate_sheet_cache, the version only moves if the content changed,
+    so delta-sync clients don't have to reload for nothing.
+    """
+    with _sheet_cache_lock:
+        _sheet_cache.pop(sheet_name, None)
+    return get_versioned_records(sheet_name)
+
+
+def _as_record(headers, values):
+    """Build a record shaped like get_all_records() output from raw row values."""
+    values = list(values) + [""] * (len(headers) - len(values))
+    return dict(zip(headers, numericise_all([v if v is not None else "" for v in values[:len(headers)]])))
+
+
+def get_versioned_records(sheet_name):
+    """
+    Return (records, version) for a worksheet, served from the in-process
+    cache when fresh, then from the SQLite mirror (if enabled), then from
+    Google. The returned list must be treated as read-only.
+    """
+    for _ in range(SHEET_FETCH_ATTEMPTS):
+        cached = _cache_lookup(sheet_name)
+        if cached is not None:
+            return cached
+
+        # A write landing while we read must not be overwritten by the older rows
+        expected = _cache_version(sheet_name)
+        mirrored = mirror_service.mirrors(sheet_name)
+        if mirrored:
+            start_mirror()
+            rows = mirror_service.load_rows(sheet_name)
+            if rows is not None:
+                version = _cache_store(sheet_name, rows, expected_version=expected)
+                if version is not None:
+                    return rows, version
+                continue
+            generation = mirror_service.generation(sheet_name)
+
+        rows = get_worksheet(sheet_name).get_all_records()
+        _check_schema(sheet_name, rows)
+        version = _cache_store(sheet_name, rows, expected_version=expected)
+        if version is not None:
+            if mirrored:
+                mirror_service.store_rows(sheet_name, rows, expected_generation=generation)
+            return rows, version
+
+    # Writes kept racing the read: serve these rows once without caching them
+    return rows, expected
+
+
+def get_cached_records(sheet_name):
+    return get_versioned_records(sheet_name)[0]
+
+
+def get_sheet_changes(sheet_name, since):
+    """
+    Return the ordered list of row changes after version `since`, or None
+    when they can't be described row by row and a full reload is needed.
+    """
+    try:
+        epoch, since_version = since.split(".", 1)
+        since_version = int(since_version)
+    except (AttributeError, ValueError):
+        return None
+    if epoch != version_log.epoch():
+        return None
+
+    entries = version_log.changes_since(sheet_name, since_version)
+    if entries is None:
+        return None
+
+    changes = []
+    for _, op, rowindex, record in entries:
+        if op == "reset":
+            return None
+        if op == "delete":
+            changes.append({"op": "delete", "rowindex": rowindex})
+        else:
+            changes.append({"op": op, "row": dict(record, rowindex=rowindex)})
+    return changes
+
+
+def _cache_reset(sheet_name):
+    # Caller must hold _sheet_cache_lock
+    _sheet_cache.pop(sheet_name, None)
+    version_log.record(sheet_name, [("reset", None, None)])
+    if mirror_service.MIRROR_ENABLED:
+        mirror_service.mark_stale(sheet_name)
+
+
 # =====================================================
-def save_image_to_drive(base64_string, filename, subfolder_name):
+#  ✅  SQLite mirror wiring (see mirror_service.py)
+# =====================================================
+def _values_to_records(values):
+    """Turn a raw values grid (header row first) into get_all_records()-style dicts."""
+    if not values:
+        return []
+    headers = values[0]
+    return [_as_record(headers, row) for row in values[1:]]
+
+
+def _fetch_all_sheets():
+    """Read every mirrored sheet listed in SHEET_PERMISSIONS with a single batch call."""
+    spreadsheet = get_spreadsheet()
+    existing = {ws.title for ws in spreadsheet.worksheets()}
+    names = [name for name in SHEET_PERMISSIONS if name in existing and mirror_service.mirrors(name)]
+    if not names:
+        return {}
+    result = spreadsheet.values_batch_get([f"'{name}'" for name in names])
+    return {
+        name: _values_to_records(value_range.get("values", []))
+        for name, value_range in zip(names, result.get("valueRanges", []))
+    }
+
+
+def _on_mirror_changed(sheet_name, rows):
+    # Content moved on in Google: refresh the in-process copy (bumps the version)
+    _cache_store(sheet_name, rows)
+
+
+def start_mirror():
+    """Start the mirror sync thread (once per process; no-op unless SHEETS_MIRROR is set)."""
+    if mirror_service.MIRROR_ENABLED:
+        mirror_service.start_sync_worker(_fetch_all_sheets, _on_mirror_changed)
+
+
+def appended_row_index(response):
+    """First sheet row written by a values.append call, or None if unknown."""
     try:
-        if not base64_string or not isinstance(base64_string, str) or "base64," not in base64_string:
-            return ""
+        updated_range = response["updates"]["updatedRange"]
+        return int(updated_range.split("!")[-1].split(":")[0].lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    except Exception:
+        return None
 
-        # Ensure subfolder exists
-        query = f"'{FOLDER_A_ID}' in parents and name='{subfolder_name}' and mimeType='application/vnd.google-apps.folder'"
-        results = drive_service.files().list(q=query, fields="files(id)").execute()
-        
-        if results["files"]:
-            subfolder_id = results["files"][0]["id"]
+
+def _cached_entry(sheet_name):
+    """The cached copy of a sheet, caught up with the log, or None. Caller must hold _sheet_cache_lock."""
+    entry = _sheet_cache.get(sheet_name)
+    if entry is not None and not _catch_up(sheet_name, entry):
+        del _sheet_cache[sheet_name]
+        return None
+    return entry
+
+
+def _log_rows(sheet_name, entry, rows, changes):
+    """
+    Log row changes and move the cached copy to `rows`. Caller must hold
+    _sheet_cache_lock.
+
+    Returns:
+        False if another worker logged a change in between — a reset
+        was logged instead and the copy dropped
+    """
+    version, in_step = version_log.record(
+        sheet_name, changes, expected=entry["version"], digest=_records_hash(rows)
+    )
+    if not in_step:
+        _sheet_cache.pop(sheet_name, None)
+        if mirror_service.MIRROR_ENABLED:
+            mirror_service.mark_stale(sheet_name)
+        return False
+    entry.update(rows=rows, version=version)
+    return True
+
+
+def _cache_after_append(sheet_name, headers, rows_values, response):
+    """
+    Write-through for appended rows. Only applied when the sheet reports
+    the rows landed exactly after the cached rows; otherwise the cached
+    copy is stale and gets dropped.
+    """
+    appended_at = appended_row_index(response)
+    if appended_at is None:
+        invalidate_sheet_cache(sheet_name)
+        return
+
+    with _sheet_cache_lock:
+        entry = _cached_entry(sheet_name)
+        if entry is None or appended_at != len(entry["rows"]) + 2:
+            _cache_reset(sheet_name)
+            return
+        records = [_as_record(headers, values) for values in rows_values]
+        changes = [("add", appended_at + offset, record) for offset, record in enumerate(records)]
+        if not _log_rows(sheet_name, entry, entry["rows"] + records, changes):
+            return
+    if mirror_service.MIRROR_ENABLED:
+        for offset, record in enumerate(records):
+            mirror_service.apply_append(sheet_name, appended_at + offset, record)
+
+
+def _cache_after_update(sheet_name, row_index, headers, values):
+    with _sheet_cache_lock:
+        entry = _cached_entry(sheet_name)
+        pos = row_index - 2
+        if entry is None or not 0 <= pos < len(entry["rows"]):
+            _cache_reset(sheet_name)
+            return
+        record = _as_record(headers, values)
+        rows = list(entry["rows"])
+        rows[pos] = record
+        if not _log_rows(sheet_name, entry, rows, [("update", row_index, record)]):
+            return
+    if mirror_service.MIRROR_ENABLED:
+        mirror_service.apply_update(sheet_name, row_index, record)
+
+
+def _cache_after_delete(sheet_name, row_index):
+    with _sheet_cache_lock:
+        entry = _cached_entry(sheet_name)
+        pos = row_index - 2
+        if entry is None or not 0 <= pos < len(entry["rows"]):
+            _cache_reset(sheet_name)
+            return
+        rows = entry["rows"][:pos] + entry["rows"][pos + 1:]
+        if not _log_rows(sheet_name, entry, rows, [("delete", row_index, None)]):
+            return
+    if mirror_service.MIRROR_ENABLED:
+        mirror_service.apply_delete(sheet_name, row_index)
+
+
+# Write-through for rows written outside this module (HSE stock endpoints)
+def cache_rows_appended(sheet_name, headers, rows_values, response):
+    _cache_after_append(sheet_name, headers, rows_values, response)
+
+
+def cache_row_updated(sheet_name, row_index, headers, values):
+    _cache_after_update(sheet_name, row_index, headers, values)
+
+# =====================================================
+#  ✅  Suivi: machine -> trailer row index
+#
+#  A trailer row belongs to the machine right above it
+#  (unless its "Parent Plate" names another plate), else
+#  to the machine whose plate is in its "Parent Plate"
+#  column. The next row is always read along with the
+#  machine row; the index below covers trailers that sit
+#  elsewhere. It is built from the cached Suivi rows and
+#  rebuilt whenever their version changes — i.e. after
+#  every Suivi write.
+# =====================================================
+SUIVI_PARENT_COLUMN = "Parent Plate"
+
+_trailer_index = {"version": None, "by_plate": {}}
+_trailer_index_lock = threading.Lock()
+
+
+def _is_trailer(row):
+    return str(row.get('Machinery', '')).strip() == 'Trailer'
+
+
+def _plate(row):
+    return str(row.get('Plate Number', '')).strip()
+
+
+def _parent_plate(row):
+    return str(row.get(SUIVI_PARENT_COLUMN, '')).strip()
+
+
+def _build_trailer_index(records):
+    by_plate = {}  # parent plate -> row index of a trailer not right below its machine
+    previous = None
+    for idx, row in enumerate(records, start=2):
+        if _is_trailer(row):
+            parent = _parent_plate(row)
+            below_parent = previous is not None and not _is_trailer(previous) and parent in ("", _plate(previous))
+            # Trailers right below their machine are found by the next-row check
+            if parent and not below_parent:
+                by_plate.setdefault(parent, idx)
+        previous = row
+    return by_plate
+
+
+def _linked_trailer(schema, row_index):
+    """
+    Returns:
+        (cached plate of the row, indexed trailer row index or None,
+        index of the next row or None if past the grid),
+        or (None, None, None) if the row is a trailer / not in the cache
+    """
+    records, version = get_versioned_records("Suivi")
+    with _trailer_index_lock:
+        if _trailer_index["version"] != version:
+            _trailer_index.update(version=version, by_plate=_build_trailer_index(records))
+        by_plate = _trailer_index["by_plate"]
+    pos = row_index - 2
+    if not 0 <= pos < len(records) or _is_trailer(records[pos]):
+        return None, None, None
+    plate = _plate(records[pos])
+    grid_rows = max(len(records) + 1, schema["worksheet"].row_count)
+    next_idx = row_index + 1 if row_index + 1 <= grid_rows else None
+    return plate, by_plate.get(plate) if plate else None, next_idx
+
+
+def _pick_trailer(row, fresh, cached_plate, indexed_idx, next_idx):
+    """
+    Choose a machine row's trailer from freshly read rows.
+
+    Args:
+        row: the machine row, read fresh
+        fresh: {row_index: row_dict} holding the candidate rows
+
+    Returns:
+        (trailer row index or None, False if the cached index turned out stale)
+    """
+    if _is_trailer(row):
+        return None, cached_plate is None
+    plate = _plate(row)
+    cache_ok = cached_plate == plate
+    if next_idx is not None:
+        below = fresh[next_idx]
+        if _is_trailer(below) and _parent_plate(below) in ("", plate):
+            return next_idx, cache_ok
+    if indexed_idx is not None:
+        trailer = fresh[indexed_idx]
+        if plate and _is_trailer(trailer) and _parent_plate(trailer) == plate:
+            return indexed_idx, cache_ok
+        return None, False
+    return None, cache_ok
+
+
+def read_suivi_rows(schema, row_index):
+    """
+    Read a Suivi row, the row below it and its indexed trailer row (if
+    any) fresh from the sheet with a single batch_get. If the cached
+    rows behind the index turn out to be out of date, it is rebuilt
+    from a fresh copy once.
+
+    Returns:
+        (row_dict, trailer_row_index or None, trailer_dict or None)
+    """
+    for attempt in range(2):
+        cached_plate, indexed_idx, next_idx = _linked_trailer(schema, row_index)
+        wanted = {row_index} | {i for i in (indexed_idx, next_idx) if i is not None}
+        fresh = read_rows(schema, wanted)
+        row = fresh[row_index]
+        trailer_idx, cache_ok = _pick_trailer(row, fresh, cached_plate, indexed_idx, next_idx)
+        # Whatever was picked has been checked against the fresh rows
+        if cache_ok or attempt == 1:
+            return row, trailer_idx, fresh[trailer_idx] if trailer_idx is not None else None
+        invalidate_sheet_cache("Suivi")
+
+# =====================================================
+#  ✅  Delete several rows in one API call
+# =====================================================
+def merge_row_ranges(row_indexes):
+    """[9, 3, 4, 5, 10] -> [(9, 10), (3, 5)]: contiguous runs, highest first."""
+    runs = []
+    for idx in sorted(set(row_indexes)):
+        if runs and idx == runs[-1][1] + 1:
+            runs[-1][1] = idx
         else:
+            runs.append([idx, idx])
+    return [tuple(run) for run in reversed(runs)]
+
+
+def read_rows(schema, row_indexes):
+    """
+    Read several rows fresh from the sheet with one batch_get (one range
+    per contiguous run).
+
+    Returns:
+        {row_index: row_dict} — rows past the end of the sheet come back empty
+    """
+    headers = schema["headers"]
+    runs = merge_row_ranges(row_indexes)
+    if not runs:
+        return {}
+    ranges = [f"A{first}:{schema['last_col']}{last}" for first, last in runs]
+    rows = {}
+    for (first, last), value_range in zip(runs, schema["worksheet"].batch_get(ranges)):
+        for offset in range(last - first + 1):
+            existing = list(value_range[offset]) if offset < len(value_range) else []
+            # Pad existing row if shorter than headers
+            existing += [""] * (len(headers) - len(existing))
+            rows[first + offset] = dict(zip(headers, existing))
+    return rows
+
+
+def delete_row_ranges(schema, row_indexes):
+    """
+    Delete rows with a single batchUpdate of deleteDimension requests.
+    Runs are deleted from the bottom up, so earlier deletes don't shift
+    the rows of later ones.
+    """
+    sheet = schema["worksheet"]
+    runs = merge_row_ranges(row_indexes)
+    if runs:
+        sheet.spreadsheet.batch_update({"requests": [
+            {
+                "deleteDimension": {
+                    "range": {"sheetId": sheet.id, "dimension": "ROWS", "startIndex": first - 1, "endIndex": last}
+                }
+            }
+            for first, last in runs
+        ]})
+    return runs
+
+# =====================================================
+#  ✅  Write several rows in one API call
+# =====================================================
+def _cell(value):
+    # Same result as a RAW values write
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": "" if value is None else str(value)}}
+
+
+def write_rows(schema, row_writes, insert_at=None):
+    """
+    Write whole rows with a single request, so they all land or none do.
+
+    Args:
+        row_writes: [(row_index, values)] — indexes as they are after the insert
+        insert_at: first insert an empty row at this index (rows below move down)
+    """
+    sheet = schema["worksheet"]
+    if insert_at is None:
+        if len(row_writes) == 1:
+            row_index, values = row_writes[0]
+            sheet.update(range_name=row_range(schema, row_index), values=[values])
+        else:
+            sheet.batch_update([
+                {"range": row_range(schema, row_index), "values": [values]}
+                for row_index, values in row_writes
+            ])
+        return
+
+    requests = [{
+        "insertDimension": {
+            "range": {"sheetId": sheet.id, "dimension": "ROWS", "startIndex": insert_at - 1, "endIndex": insert_at},
+            "inheritFromBefore": False
+        }
+    }]
+    for row_index, values in row_writes:
+        requests.append({
+            "updateCells": {
+                "start": {"sheetId": sheet.id, "rowIndex": row_index - 1, "columnIndex": 0},
+                "rows": [{"values": [_cell(v) for v in values]}],
+                "fields": "userEnteredValue"
+            }
+        })
+    sheet.spreadsheet.batch_update({"requests": requests})
+
+# =====================================================
+#  ✅  Upload payloads: Base64 data URL or file part
+#
+#  JSON requests carry files as "data:...;base64,"
+#  strings. multipart/form-data requests carry them as
+#  file parts (werkzeug FileStorage, spooled to a temp
+#  file), which are streamed to Drive without a Base64
+#  round trip.
+# =====================================================
+PDF_UPLOAD_FIELDS = {'Documents', 'Driver 1 Doc', 'Driver 2 Doc', 'Trailer Documents'}
+CHECKLIST_UPLOAD_PREFIX = "Checklist Data/"  # file part "Checklist Data/<item_key>"
+
+
+def accepts_upload(sheet_name, key, edit=False):
+    """Form keys that may carry a file part on this sheet (add, or edit if edit=True)."""
+    if key.startswith(CHECKLIST_UPLOAD_PREFIX):
+        # Checklist photos are only unpacked when a checklist is added
+        return sheet_name == "Checklist_Log" and not edit
+    if key in PDF_UPLOAD_FIELDS:
+        # PDFs are only uploaded by the Suivi add/edit logic
+        return sheet_name == "Suivi"
+    return "Photo" in key
+
+
+def is_image_upload(value):
+    return isinstance(value, FileStorage) or (isinstance(value, str) and value.startswith("data:image"))
+
+
+def is_pdf_upload(value):
+    return isinstance(value, FileStorage) or (isinstance(value, str) and value.startswith("data:application/pdf"))
+
+
+def _open_payload(payload):
+    """Readable, seekable stream for a file part or a Base64 data URL."""
+    if isinstance(payload, FileStorage):
+        payload.stream.seek(0)
+        return payload.stream
+    return io.BytesIO(base64.b64decode(payload.split("base64,")[-1]))
+
+
+def _valid_payload(payload):
+    return isinstance(payload, FileStorage) or (isinstance(payload, str) and "base64," in payload)
+
+
+def _public_row(row):
+    """Copy of a row that is safe to return as JSON (file parts -> file names)."""
+    return {k: (v.filename if isinstance(v, FileStorage) else v) for k, v in row.items()}
+
+# =====================================================
+#  ✅  Utility: Public "anyone can read" grants
+#
+#  Inside deferred_sharing(), uploads only collect their
+#  file IDs; all grants are then sent together as ONE
+#  Drive batch HTTP request when the block exits.
+# =====================================================
+MULTIPART_UPLOAD_LIMIT = 5 * 1024 * 1024  # Drive's limit for single-request uploads
+DRIVE_BATCH_LIMIT = 100  # max calls per Drive batch request
+
+_share_local = threading.local()
+
+
+def drive_file_id(file_url):
+    """Extract the file ID from a Drive link (/file/d/<id>/view or uc?id=<id>)."""
+    if not file_url or 'drive.google.com' not in file_url:
+        return None
+    if '/file/d/' in file_url:
+        return file_url.split('/file/d/')[1].split('/')[0]
+    if 'id=' in file_url:
+        return file_url.split('id=')[1].split('&')[0]
+    return None
+
+
+def _new_media(data, mimetype):
+    """Upload body from bytes or a seekable stream (e.g. a spooled upload)."""
+    if isinstance(data, (bytes, bytearray)):
+        stream, size = io.BytesIO(data), len(data)
+    else:
+        stream = data
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+    # Small files go up in one multipart request; only big ones need a resumable session
+    return MediaIoBaseUpload(stream, mimetype=mimetype, resumable=size > MULTIPART_UPLOAD_LIMIT)
+
+
+def make_files_public(file_ids):
+    """Grant public read access to several files with one batch request per 100 files."""
+    # A request ID may only appear once per batch
+    file_ids = list(dict.fromkeys(f for f in file_ids if f))
+    permission = {"type": "anyone", "role": "reader"}
+    failed = []
+
+    def on_done(request_id, response, exception):
+        if exception is not None:
+            failed.append(request_id)
+
+    with drive_client() as service:
+        for start in range(0, len(file_ids), DRIVE_BATCH_LIMIT):
+            batch = service.new_batch_http_request(callback=on_done)
+            for file_id in file_ids[start:start + DRIVE_BATCH_LIMIT]:
+                batch.add(service.permissions().create(fileId=file_id, body=permission), request_id=file_id)
+            try:
+                batch.execute()
+            except Exception as e:
+                print(f"Batch permission error: {e}")
+                failed.extend(file_ids[start:start + DRIVE_BATCH_LIMIT])
+
+        # Fall back to one call each for whatever the batch didn't grant
+        for file_id in failed:
+            try:
+                service.permissions().create(fileId=file_id, body=permission).execute()
+            except Exception as e:
+                print(f"Permission Error ({file_id}): {e}")
+
+
+def _share(file_ids):
+    """Grant now, or queue for the surrounding deferred_sharing() block."""
+    pending = getattr(_share_local, "pending", None)
+    if pending is not None:
+        pending.extend(f for f in file_ids if f not in pending)
+    else:
+        make_files_public(file_ids)
+
+
+@contextmanager
+def deferred_sharing():
+    if getattr(_share_local, "pending", None) is not None:
+        # Already inside an outer block; it will send the grants
+        yield
+        return
+    _share_local.pending = []
+    try:
+        yield
+    finally:
+        pending, _share_local.pending = _share_local.pending, None
+        if pending:
+            # The rows are already written; a failed grant must not fail the request
+            try:
+                make_files_public(pending)
+            except Exception as e:
+                print(f"Deferred sharing error: {e}")
+
+# =====================================================
+#  ✅  Utility: Find (or create) a photo subfolder
+#
+#  Resolved IDs are kept for the life of the process.
+#  A per-name lock stops two threads from creating the
+#  same folder; across processes, everyone settles on
+#  the OLDEST folder with that name.
+# =====================================================
+_subfolder_ids = {}
+_subfolder_locks = {}
+_subfolder_registry_lock = threading.Lock()
+
+
+def _find_subfolder(subfolder_name):
+    query = f"'{FOLDER_A_ID}' in parents and name='{subfolder_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+    with drive_client() as service:
+        results = service.files().list(q=query, orderBy="createdTime", fields="files(id)").execute()
+    return results["files"][0]["id"] if results["files"] else None
+
+
+def get_subfolder_id(subfolder_name):
+    folder_id = _subfolder_ids.get(subfolder_name)
+    if folder_id:
+        return folder_id
+
+    with _subfolder_registry_lock:
+        lock = _subfolder_locks.setdefault(subfolder_name, threading.Lock())
+
+    with lock:
+        folder_id = _subfolder_ids.get(subfolder_name)
+        if folder_id:
+            return folder_id
+
+        folder_id = _find_subfolder(subfolder_name)
+        if not folder_id:
             metadata = {
                 "name": subfolder_name,
                 "mimeType": "application/vnd.google-apps.folder",
                 "parents": [FOLDER_A_ID]
             }
-            subfolder = drive_service.files().create(body=metadata, fields="id").execute()
-            subfolder_id = subfolder["id"]
+            with drive_client() as service:
+                created = service.files().create(body=metadata, fields="id").execute()
+            # Another worker may have created one at the same moment — use the oldest
+            folder_id = _find_subfolder(subfolder_name) or created["id"]
 
-        # Decode image and upload
-        img_data = base64.b64decode(base64_string.split("base64,")[-1])
-        file_stream = io.BytesIO(img_data)
-        
-        file_metadata = {"name": filename, "parents": [subfolder_id]}
-        media = MediaIoBaseUpload(file_stream, mimetype="image/jpeg", resumable=True)
-        
-        uploaded_file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields="id"
-        ).execute()
+        _subfolder_ids[subfolder_name] = folder_id
+        return folder_id
 
-        # Make public
-        drive_service.permissions().create(
-            fileId=uploaded_file["id"],
-            body={"type": "anyone", "role": "reader"}
-        ).execute()
 
-        return f"https://drive.google.com/uc?id={uploaded_file['id']}"
+def forget_subfolder_id(subfolder_name):
+    """Drop a cached folder ID (e.g. after Drive answered 404 for it)."""
+    _subfolder_ids.pop(subfolder_name, None)
+
+# =====================================================
+#  ✅  Utility: Reuse identical uploads
+#
+#  upload_index remembers which Drive file holds which
+#  content; a resubmitted photo/PDF points to that file
+#  instead of being uploaded again.
+# =====================================================
+def _upload_key(stream, scope):
+    if not upload_index.UPLOAD_DEDUP_ENABLED:
+        return None
+    return upload_index.content_key(stream, scope)
+
+
+def _reusable_upload(key):
+    """(url, thumb) of an earlier upload of the same content, if its file still exists."""
+    entry = upload_index.lookup(key) if key else None
+    if not entry:
+        return None
+    file_id, url, thumb = entry
+    try:
+        with drive_client() as service:
+            meta = service.files().get(fileId=file_id, fields="id,trashed").execute()
+    except HttpError as e:
+        if e.resp.status == 404:
+            upload_index.forget(key)
+        return None
+    except Exception as e:
+        print(f"Upload index check error: {e}")
+        return None
+    if meta.get("trashed"):
+        upload_index.forget(key)
+        return None
+    upload_index.acquire(key)
+    return url, thumb
+
+
+# =====================================================
+#  ✅  Utility: Give uploads back when the write fails
+#
+#  A fresh upload and a reused one both hold an
+#  upload_index reference meant for the row being
+#  written. Inside upload_claims(), uploads note their
+#  links; if the write then fails, the links go to the
+#  Drive cleanup, which releases the references (and
+#  deletes the files nothing else uses).
+# =====================================================
+_claim_local = threading.local()
+
+
+def _without_indexed_thumbs(urls):
+    if upload_index.UPLOAD_DEDUP_ENABLED:
+        # Thumbnails of indexed photos go with their photo's last reference
+        return [u for u in urls if not upload_index.is_indexed_thumb(u)]
+    return urls
+
+
+def _claim_uploads(urls):
+    claimed = getattr(_claim_local, "urls", None)
+    if claimed is not None:
+        claimed.extend(_without_indexed_thumbs([u for u in urls if u and u != "ERROR_UPLOAD"]))
+
+
+def _unclaim_upload(url):
+    claimed = getattr(_claim_local, "urls", None)
+    if claimed is not None and url in claimed:
+        claimed.remove(url)
+
+
+@contextmanager
+def upload_claims():
+    """
+    Yields settle(result): pass the write's result through it. Unless
+    the result is a success, the uploads made in the block are released.
+    """
+    if getattr(_claim_local, "urls", None) is not None:
+        # Already inside an outer block; it settles the uploads
+        yield lambda result: result
+        return
+    _claim_local.urls = []
+    outcome = {"ok": False}
+
+    def settle(result):
+        outcome["ok"] = isinstance(result, dict) and result.get("status") != "error"
+        return result
+
+    try:
+        yield settle
+    finally:
+        urls, _claim_local.urls = _claim_local.urls, None
+        if urls and not outcome["ok"]:
+            print(f"Write failed, releasing {len(urls)} upload(s)")
+            queue_drive_deletes(urls)
+
+# =====================================================
+#  ✅  Utility: Image processing before upload
+#
+#  Phone photos are re-encoded to a capped size and
+#  quality (which also drops EXIF, GPS included) and a
+#  small thumbnail is made for list views. Anything
+#  Pillow can't read is uploaded untouched.
+# =====================================================
+IMAGE_MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", "1600"))  # px, longest side
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "80"))
+THUMBNAIL_DIMENSION = int(os.environ.get("THUMBNAIL_DIMENSION", "320"))  # px, longest side
+
+
+def _encode_jpeg(img, max_dimension):
+    img = img.copy()
+    img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    out = io.BytesIO()
+    # No exif= argument, so the metadata is not carried over
+    img.save(out, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def prepare_image(source, thumbnail=True):
+    """
+    Args:
+        source: seekable stream with the original image
+
+    Returns:
+        (image_bytes, thumbnail_bytes or None) — the untouched source
+        stream is returned instead if the image can't be processed
+    """
+    try:
+        with Image.open(source) as img:
+            # Bake the EXIF orientation into the pixels before it is stripped
+            img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            full = _encode_jpeg(img, IMAGE_MAX_DIMENSION)
+            thumb = _encode_jpeg(img, THUMBNAIL_DIMENSION) if thumbnail else None
+        return full, thumb
+    except Exception as e:
+        print(f"Image processing skipped: {e}")
+        return source, None
+
+# =====================================================
+#  ✅  Utility: Upload Base64 image to Google Drive
+# =====================================================
+def _upload_image_bytes(img_data, filename, subfolder_name):
+    def upload():
+        # Ensure subfolder exists, then upload
+        file_metadata = {"name": filename, "parents": [get_subfolder_id(subfolder_name)]}
+        media = _new_media(img_data, "image/jpeg")
+        with drive_client() as service:
+            return service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields="id"
+            ).execute()
+
+    try:
+        return upload()["id"]
+    except HttpError as e:
+        if e.resp.status != 404:
+            raise
+        # Cached folder was deleted/moved in Drive — resolve it again once
+        forget_subfolder_id(subfolder_name)
+        return upload()["id"]
+
+
+def _store_photo(source, filename, subfolder_name, thumbnail=True):
+    """
+    Upload (or reuse) a photo and its thumbnail without sharing them.
+
+    Returns:
+        (photo_url, thumbnail_url, new_file_ids) — new_file_ids lists only
+        files created by this call, i.e. the ones that still need sharing
+    """
+    if not source or not _valid_payload(source):
+        return "", "", []
+
+    stream = _open_payload(source)
+    key = _upload_key(stream, subfolder_name)
+    reused = _reusable_upload(key)
+    if reused:
+        # Already shared when it was first uploaded
+        return reused[0], reused[1], []
+
+    # Decode, shrink and strip the image
+    img_data, thumb_data = prepare_image(stream, thumbnail=thumbnail)
+
+    file_id = _upload_image_bytes(img_data, filename, subfolder_name)
+    file_ids = [file_id]
+
+    thumb_url = ""
+    if thumb_data:
+        try:
+            thumb_id = _upload_image_bytes(thumb_data, f"thumb_{filename}", subfolder_name)
+            file_ids.append(thumb_id)
+            thumb_url = f"https://drive.google.com/uc?id={thumb_id}"
+        except Exception as e:
+            print(f"Thumbnail Upload Error: {str(e)}")
+
+    url = f"https://drive.google.com/uc?id={file_id}"
+    if key:
+        upload_index.remember(key, file_id, url, thumb_url)
+    return url, thumb_url, file_ids
+
+
+def save_photo_to_drive(source, filename, subfolder_name, share=True, thumbnail=True):
+    """
+    Compress and upload a photo (Base64 data URL or file part), plus a
+    thumbnail next to it.
+
+    Returns:
+        (photo_url, thumbnail_url) — ("", "") when there is no image,
+        ("ERROR_UPLOAD", "") when the upload failed. thumbnail_url is ""
+        if no thumbnail could be made or uploaded.
+    """
+    try:
+        url, thumb_url, new_ids = _store_photo(source, filename, subfolder_name, thumbnail=thumbnail)
+        _claim_uploads([url, thumb_url])
+
+        # Make public
+        if share and new_ids:
+            _share(new_ids)
+        return url, thumb_url
     except Exception as e:
         print(f"Upload Error: {str(e)}")
-        return f"ERROR_UPLOAD"
+        return "ERROR_UPLOAD", ""
+
+
+def save_image_to_drive(source, filename, subfolder_name, share=True):
+    """Compress and upload an image; returns its Drive link only."""
+    return save_photo_to_drive(source, filename, subfolder_name, share=share, thumbnail=False)[0]
+
+# =====================================================
+#  ✅  Utility: Upload many images concurrently
+# =====================================================
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "6"))
+
+
+def save_images_to_drive(uploads, subfolder_name):
+    """
+    Upload several photos (with thumbnails) on a bounded thread pool.
+
+    Args:
+        uploads: dict of key -> (Base64 string or file part, filename)
+        subfolder_name: photo subfolder under FOLDER_A_ID
+
+    Returns:
+        (urls, failed) — urls maps key -> (photo_url, thumbnail_url),
+        failed lists the keys whose upload did not succeed
+    """
+    if not uploads:
+        return {}, []
+
+    # Resolve the folder once up front so parallel uploads don't race to create it
+    try:
+        get_subfolder_id(subfolder_name)
+    except Exception as e:
+        print(f"Subfolder lookup error: {e}")
+
+    urls = {}
+    new_ids = []  # only fresh uploads need sharing; reused files already are
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(uploads))) as pool:
+        futures = {
+            pool.submit(_store_photo, data, filename, subfolder_name): key
+            for key, (data, filename) in uploads.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                url, thumb_url, file_ids = future.result()
+                urls[key] = (url, thumb_url)
+                _claim_uploads([url, thumb_url])
+                new_ids.extend(file_ids)
+            except Exception as e:
+                print(f"Upload Error ({key}): {e}")
+                urls[key] = ("ERROR_UPLOAD", "")
+
+    failed = [key for key, (url, _) in urls.items() if not url or url == "ERROR_UPLOAD"]
+    _share(new_ids)
+    return urls, failed
 
 # =====================================================
 #  ✅  NEW: Upload PDF to Google Drive
 # =====================================================
-def save_pdf_to_drive(base64_string, filename, parent_folder_id):
+def save_pdf_to_drive(source, filename, parent_folder_id, share=True):
     """
-    Upload Base64 PDF to Google Drive
+    Upload a PDF (Base64 string or multipart file part) to Google Drive
     
     Args:
-        base64_string: Base64 encoded PDF string
+        source: Base64 encoded PDF string or uploaded file part
         filename: Name for the uploaded file
         parent_folder_id: Google Drive folder ID where file will be stored
     
@@ -136,13 +1244,18 @@ def save_pdf_to_drive(base64_string, filename, parent_folder_id):
         Google Drive shareable link or empty string on error
     """
     try:
-        if not base64_string or 'base64,' not in base64_string:
+        if not source or not _valid_payload(source):
             print("Invalid base64 string")
             return ""
         
-        # Decode PDF data
-        pdf_data = base64.b64decode(base64_string.split('base64,')[-1])
-        file_stream = io.BytesIO(pdf_data)
+        # Decode PDF data (file parts are streamed as they are)
+        pdf_data = _open_payload(source)
+        key = _upload_key(pdf_data, parent_folder_id)
+        reused = _reusable_upload(key)
+        if reused:
+            print(f"PDF already in Drive, reusing it: {filename} -> {reused[0]}")
+            _claim_uploads([reused[0]])
+            return reused[0]
         
         # Prepare file metadata
         file_metadata = {
@@ -151,21 +1264,23 @@ def save_pdf_to_drive(base64_string, filename, parent_folder_id):
         }
         
         # Upload to Drive
-        media = MediaIoBaseUpload(file_stream, mimetype='application/pdf', resumable=True)
-        uploaded_file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        media = _new_media(pdf_data, 'application/pdf')
+        with drive_client() as service:
+            uploaded_file = service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id'
+            ).execute()
         
         # Make file publicly readable
-        drive_service.permissions().create(
-            fileId=uploaded_file['id'],
-            body={'type': 'anyone', 'role': 'reader'}
-        ).execute()
+        if share:
+            _share([uploaded_file['id']])
         
         # Return viewable link
         file_link = f"https://drive.google.com/file/d/{uploaded_file['id']}/view"
+        if key:
+            upload_index.remember(key, uploaded_file['id'], file_link)
+        _claim_uploads([file_link])
         print(f"PDF uploaded successfully: {filename} -> {file_link}")
         return file_link
         
@@ -176,6 +1291,38 @@ def save_pdf_to_drive(base64_string, filename, parent_folder_id):
 # =====================================================
 #  ✅  NEW: Delete File from Google Drive
 # =====================================================
+def _delete_drive_file(file_url):
+    """Delete one Drive file by URL; raises if Drive refused (a missing file counts as deleted)."""
+    if not file_url or 'drive.google.com' not in file_url:
+        return
+
+    # Extract file ID from URL
+    # URL format: https://drive.google.com/file/d/FILE_ID/view or https://drive.google.com/uc?id=FILE_ID
+    file_id = drive_file_id(file_url)
+    if not file_id:
+        print(f"Cannot extract file ID from URL: {file_url}")
+        return
+
+    # Another row may still point to the same (deduplicated) file
+    thumb_url = ""
+    if upload_index.UPLOAD_DEDUP_ENABLED:
+        thumb_url = upload_index.thumb_of(file_id)
+        if not upload_index.release(file_id):
+            print(f"File still referenced, not deleted: {file_id}")
+            return
+
+    try:
+        with drive_client() as service:
+            service.files().delete(fileId=file_id).execute()
+    except HttpError as e:
+        if e.resp.status != 404:
+            raise
+    print(f"File deleted successfully: {file_id}")
+    if thumb_url:
+        # Its thumbnail was kept while the photo was shared (see _attached_files)
+        queue_drive_deletes([thumb_url])
+
+
 def delete_file_from_drive(file_url):
     """
     Delete a file from Google Drive using its shareable URL
@@ -189,26 +1336,61 @@ def delete_file_from_drive(file_url):
     try:
         if not file_url or 'drive.google.com' not in file_url:
             return False
-        
-        # Extract file ID from URL
-        # URL format: https://drive.google.com/file/d/FILE_ID/view or https://drive.google.com/uc?id=FILE_ID
-        if '/file/d/' in file_url:
-            file_id = file_url.split('/file/d/')[1].split('/')[0]
-        elif 'id=' in file_url:
-            file_id = file_url.split('id=')[1].split('&')[0]
-        else:
-            print(f"Cannot extract file ID from URL: {file_url}")
-            return False
-        
-        # Delete file
-        drive_service.files().delete(fileId=file_id).execute()
-        print(f"File deleted successfully: {file_id}")
+        _delete_drive_file(file_url)
         return True
         
     except Exception as e:
         print(f"Error deleting file: {str(e)}")
         return False
 
+
+def queue_drive_deletes(file_urls):
+    """
+    Hand files that rows no longer use to the background cleanup
+    worker (drive_cleanup), so the request doesn't wait on Drive.
+    Falls back to deleting inline if the backlog can't be written.
+    """
+    file_urls = [u for u in file_urls if u and 'drive.google.com' in u]
+    if not file_urls:
+        return
+    try:
+        drive_cleanup.enqueue(file_urls)
+        start_drive_cleanup()
+    except Exception as e:
+        print(f"Drive cleanup queue error, deleting inline: {e}")
+        for file_url in file_urls:
+            delete_file_from_drive(file_url)
+
+
+def start_drive_cleanup():
+    """Start the cleanup worker (once per process); app.py calls it at startup."""
+    drive_cleanup.start_worker(_delete_drive_file)
+
+# =====================================================
+#  ✅  Replace an attached PDF
+# =====================================================
+def replace_pdf_in_drive(old_url, source, filename, parent_folder_id):
+    """
+    Upload a replacement PDF. The old file is not deleted here: the
+    caller queues it with queue_drive_deletes() once the row pointing
+    to the new file has been written.
+
+    Returns:
+        (new_link, replaced_link) — new_link is the old one if the upload
+        failed; replaced_link is "" when there is nothing to delete (no
+        old file, failed upload, or the same content was resubmitted)
+    """
+    new_url = save_pdf_to_drive(source, filename, parent_folder_id)
+    if not new_url:
+        return old_url, ""
+    if old_url == new_url:
+        # Reuse took a second reference for a row that already held one
+        if upload_index.UPLOAD_DEDUP_ENABLED:
+            upload_index.release(drive_file_id(old_url))
+        _unclaim_upload(new_url)  # the row's own reference is not ours to give back
+        return new_url, ""
+    return new_url, old_url or ""
+
 # =====================================================
 #  ✅  Copy to Maintenance_Log
 # =====================================================
@@ -218,8 +1400,9 @@ def copy_to_maintenance_log(source_sheet, data):
     but it is NO LONGER called automatically for Cleaning_Log submissions.
     """
     try:
-        maintenance = client.open_by_key(SPREADSHEET_ID).worksheet("Maintenance_Log")
-        headers = maintenance.row_values(1)
+        schema = get_schema("Maintenance_Log")
+        maintenance = schema["worksheet"]
+        headers = schema["headers"]
         current_time = get_current_time()
         
         new_row = {}
@@ -239,43 +1422,279 @@ def copy_to_maintenance_log(source_sheet, data):
         
         row_to_add = [new_row.get(h, "") for h in headers]
         maintenance.append_row(row_to_add)
+        invalidate_sheet_cache("Maintenance_Log")
         return {"status": "success", "copied_to": "Maintenance_Log"}
     except Exception as e:
         return {"status": "error", "message": f"Failed to copy: {e}"}
 
+# =====================================================
+#  ✅  Server-side filter / sort / pagination for views
+# =====================================================
+QUERY_RESERVED_PARAMS = {"limit", "cursor", "sort", "from", "to", "date_field", "since", "options"}
+MAX_PAGE_SIZE = 500
+
+
+def _query_sort_key(value):
+    # Numbers sort numerically, everything else as text
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, "")
+    return (1, 0, str(value))
+
+
+def query_records(records, params):
+    """
+    Filter, sort and paginate sheet records.
+
+    Args:
+        records: list of record dicts (as returned by get_all_records)
+        params: mapping with getlist() (e.g. request.args) supporting:
+            <Column>=value      equality filter (repeat for "any of")
+            from / to           inclusive date range (YYYY-MM-DD) on date_field
+            date_field          column used by from/to (default "Date")
+            sort                column to sort by, "-Column" for descending
+            limit / cursor      page size and row offset (next_cursor of the previous page)
+
+    Returns:
+        (rows, total, next_cursor) where rows carry their sheet 'rowindex'
+    """
+    columns = set(records[0].keys()) if records else set()
+
+    equals = {}
+    for key in params.keys():
+        if key in QUERY_RESERVED_PARAMS or key not in columns:
+            continue
+        wanted = {v.strip() for v in params.getlist(key)}
+        if wanted:
+            equals[key] = wanted
+
+    date_field = params.get("date_field", "Date")
+    date_from = (params.get("from") or "").strip()
+    date_to = (params.get("to") or "").strip()
+
+    # Work on (rowindex, record) pairs so sheet positions survive filtering
+    matched = []
+    for index, row in enumerate(records, start=2):
+        if any(str(row.get(col, "")).strip() not in wanted for col, wanted in equals.items()):
+            continue
+        if date_from or date_to:
+            day = str(row.get(date_field, ""))[:10]
+            if not day or (date_from and day < date_from) or (date_to and day > date_to):
+                continue
+        matched.append((index, row))
+
+    sort = (params.get("sort") or "").strip()
+    if sort:
+        descending = sort.startswith("-")
+        sort_col = sort.lstrip("-")
+        # Blank values always go last, whichever the direction
+        filled = [p for p in matched if p[1].get(sort_col, "") != ""]
+        blank = [p for p in matched if p[1].get(sort_col, "") == ""]
+        filled.sort(key=lambda p: _query_sort_key(p[1].get(sort_col)), reverse=descending)
+        matched = filled + blank
+
+    total = len(matched)
+    offset = 0
+    limit = total
+    next_cursor = None
+    if params.get("limit"):
+        limit = max(1, min(int(params.get("limit")), MAX_PAGE_SIZE))
+        offset = max(0, int(params.get("cursor") or 0))
+        if offset + limit < total:
+            next_cursor = str(offset + limit)
+
+    rows = [dict(row, rowindex=index) for index, row in matched[offset:offset + limit]]
+    return rows, total, next_cursor
+
+
+def distinct_values(records, columns):
+    """{column: sorted distinct non-blank values} over all records, for filter dropdowns."""
+    values = {col: set() for col in columns}
+    for row in records:
+        for col, seen in values.items():
+            value = str(row.get(col, "")).strip()
+            if value:
+                seen.add(value)
+    return {col: sorted(seen) for col, seen in values.items()}
+
 # =====================================================
 #  ✅  Get Sheet Data (WITH ROW INDEX)
 # =====================================================
-def get_sheet_data(sheet_name):
+def get_sheet_data(sheet_name, params=None):
     """
     Fetch all records from a Google Sheet and add row index
     
     Args:
         sheet_name: Name of the Google Sheet
+        params: optional query args (see query_records). When 'limit' is
+                given the response is a page envelope instead of a list;
+                'options=<Column>' (repeatable) adds the column's distinct
+                values to it so views can fill their filter dropdowns.
+                With 'since=<version>' only the changes after that version
+                are returned (or the full sheet if they can't be).
     
     Returns:
-        JSON response with data including rowindex for each row
+        JSON response with data including rowindex for each row.
+        Carries an ETag of the sheet version; answers 304 to a matching
+        If-None-Match.
     """
     try:
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet(sheet_name)
-        rows = sheet.get_all_records()
-        
+        records, version = get_versioned_records(sheet_name)
+        etag = format_version(version)
+
+        # ✅ Delta sync: only rows added / changed / removed since a version
+        since = params.get("since") if params else None
+        if since:
+            changes = get_sheet_changes(sheet_name, since)
+            if changes is None:
+                rows = [dict(row, rowindex=index) for index, row in enumerate(records, start=2)]
+                return jsonify({"version": etag, "full": True, "rows": rows})
+            return jsonify({"version": etag, "full": False, "changes": changes})
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
         # ✅ ADD ROW INDEX TO EACH ROW (starting from row 2, since row 1 is headers)
-        for index, row in enumerate(rows, start=2):
-            row['rowindex'] = index
-        
-        return jsonify(rows)
+        # Copies are returned so the cached records stay untouched
+        if not params:
+            rows = [dict(row, rowindex=index) for index, row in enumerate(records, start=2)]
+            response = jsonify(rows)
+        else:
+            try:
+                rows, total, next_cursor = query_records(records, params)
+            except ValueError:
+                return jsonify({"error": "Invalid limit or cursor"}), 400
+
+            if params.get("limit"):
+                page = {"rows": rows, "total": total, "next_cursor": next_cursor}
+                option_columns = params.getlist("options")
+                if option_columns:
+                    page["options"] = distinct_values(records, option_columns)
+                response = jsonify(page)
+            else:
+                response = jsonify(rows)
+
+        response.set_etag(etag)
+        # Let browsers keep the body but always revalidate with the ETag
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
     except Exception as e:
         return jsonify({"error": str(e)})
 
+# =====================================================
+#  ✅  Write-behind queue for appends (optional)
+#
+#  With WRITE_BEHIND=1, appends to WRITE_BEHIND_SHEETS
+#  are queued and flushed every few seconds as ONE
+#  append call per worksheet. Callers get a job id to
+#  poll via /api/jobs/<job_id>. Failed batches are
+#  retried with exponential backoff. The queue and the
+#  job states are kept in SQLite (append_queue.py), so
+#  they are shared by all workers on the host and
+#  survive a restart.
+# =====================================================
+WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+WRITE_BEHIND_SHEETS = set(
+    s.strip() for s in os.environ.get("WRITE_BEHIND_SHEETS", "Cleaning_Log,Checklist_Log").split(",") if s.strip()
+)
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", "2"))  # seconds
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get("WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+WRITE_BEHIND_MAX_BATCH = 500
+WRITE_BEHIND_JOB_TTL = 3600  # keep finished job states for an hour
+
+_append_worker = None
+_append_worker_lock = threading.Lock()
+
+
+def enqueue_append(sheet_name, headers, values):
+    """Queue one row for a batched append. Returns the job id."""
+    job_id = uuid.uuid4().hex
+    append_queue.enqueue(job_id, sheet_name, headers, values)
+    _start_append_worker()
+    return job_id
+
+
+def get_append_job(job_id):
+    """Public view of a queued append, or None if unknown / expired."""
+    return append_queue.get(job_id)
+
+
+def flush_pending_appends(force=False):
+    """Write every due batch now (one append call per worksheet)."""
+    batches = append_queue.claim_due(WRITE_BEHIND_MAX_BATCH, WRITE_BEHIND_JOB_TTL, force=force)
+
+    for sheet_name, jobs in batches.items():
+        job_ids = [job_id for job_id, _, _ in jobs]
+        rows_values = [values for _, _, values in jobs]
+        try:
+            response = get_worksheet(sheet_name).append_rows(rows_values)
+        except Exception as e:
+            print(f"❌ Batched append to {sheet_name} failed ({len(jobs)} rows): {e}")
+            invalidate_schema(sheet_name)
+            given_up = set(append_queue.mark_failed(job_ids, str(e), WRITE_BEHIND_MAX_ATTEMPTS))
+            # Rows that will never be written give back their uploads
+            queue_drive_deletes([
+                url for job_id, headers, values in jobs if job_id in given_up
+                for url in _attached_files(dict(zip(headers, values)))
+            ])
+            continue
+
+        append_queue.mark_written(job_ids, appended_row_index(response))
+        _cache_after_append(sheet_name, jobs[0][1], rows_values, response)
+        import reference_data
+        if sheet_name in reference_data.REFERENCE_SHEETS:
+            # The API invalidated it when the row was queued, before it was written
+            reference_data.invalidate(sheet_name)
+        print(f"✅ Batched append: {len(jobs)} row(s) to {sheet_name}")
+
+
+def _append_worker_loop():
+    while True:
+        time.sleep(WRITE_BEHIND_FLUSH_INTERVAL)
+        try:
+            flush_pending_appends()
+        except Exception as e:
+            print(f"Write-behind worker error: {e}")
+
+
+def _start_append_worker():
+    global _append_worker
+    with _append_worker_lock:
+        if _append_worker is not None and _append_worker.is_alive():
+            return
+        _append_worker = threading.Thread(target=_append_worker_loop, name="write-behind", daemon=True)
+        _append_worker.start()
+
+
+if WRITE_BEHIND_ENABLED:
+    # Pick up rows queued before a restart
+    _start_append_worker()
+    # Don't leave queued rows waiting on a graceful shutdown
+    atexit.register(flush_pending_appends, True)
+
 # =====================================================
 #  ✅  Append Row (Add) - UPDATED FOR CHECKLIST & SUIVI WITH TRAILER SUPPORT
 # =====================================================
 def append_row(sheet_name, new_row):
+    # All files uploaded for this submission are made public in one batch
+    with deferred_sharing(), upload_claims() as settle:
+        return settle(_append_row(sheet_name, new_row))
+
+
+def _append_row(sheet_name, new_row):
     try:
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet(sheet_name)
-        headers = sheet.row_values(1)
+        schema = get_schema(sheet_name)
+        sheet = schema["worksheet"]
+        headers = schema["headers"]
         current_time = get_current_time()
+        upload_errors = []  # checklist items whose photo failed to upload
+
+        # Checklist photos sent as multipart file parts ("Checklist Data/<item_key>")
+        checklist_files = {
+            key[len(CHECKLIST_UPLOAD_PREFIX):]: new_row.pop(key)
+            for key in list(new_row.keys()) if key.startswith(CHECKLIST_UPLOAD_PREFIX)
+        }
 
         # ---------------------------------------------------
         #  SPECIAL LOGIC: Checklist_Log (Nested JSON Photos)
@@ -284,20 +1703,30 @@ def append_row(sheet_name, new_row):
             try:
                 # 1. Parse the JSON string coming from frontend
                 checklist_data = json.loads(new_row["Checklist Data"])
+                for item_key, upload in checklist_files.items():
+                    if not isinstance(checklist_data.get(item_key), dict):
+                        checklist_data[item_key] = {}
+                    checklist_data[item_key]["photo"] = upload
                 
                 # 2. Iterate through items to find photos
                 # Structure: { "item_id": { "status": "...", "photo": "data:image..." } }
+                uploads = {}
                 for item_key, item_val in checklist_data.items():
                     if isinstance(item_val, dict) and "photo" in item_val:
                         photo_data = item_val["photo"]
                         
-                        # If it is a Base64 string, upload it
-                        if photo_data and isinstance(photo_data, str) and photo_data.startswith("data:image"):
+                        # If it is a Base64 string, queue it for upload
+                        if photo_data and is_image_upload(photo_data):
                             filename = f"Checklist_{new_row.get('Plate Number', 'Unknown')}_{item_key}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                            uploaded_url = save_image_to_drive(photo_data, filename, "Checklist_Log")
-                            
-                            # Replace the massive Base64 string with the URL
-                            item_val["photo"] = uploaded_url
+                            uploads[item_key] = (photo_data, filename)
+
+                # Upload all photos concurrently, then replace the massive
+                # Base64 strings with their URLs
+                uploaded_urls, upload_errors = save_images_to_drive(uploads, "Checklist_Log")
+                for item_key, (uploaded_url, thumb_url) in uploaded_urls.items():
+                    checklist_data[item_key]["photo"] = uploaded_url
+                    if thumb_url:
+                        checklist_data[item_key]["thumb"] = thumb_url
                 
                 # 3. Pack the clean data back into JSON string
                 new_row["Checklist Data"] = json.dumps(checklist_data)
@@ -311,25 +1740,22 @@ def append_row(sheet_name, new_row):
         # ---------------------------------------------------
         else:
             for key in list(new_row.keys()):
-                if "Photo" in key and isinstance(new_row[key], str) and new_row[key].startswith("data:image"):
+                if "Photo" in key and is_image_upload(new_row[key]):
                     filename = f"{sheet_name}_{key}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                    new_row[key] = save_image_to_drive(new_row[key], filename, sheet_name)
+                    # A thumbnail is only made if the sheet has a "<Photo column> Thumbnail" column
+                    new_row[key], thumb_url = save_photo_to_drive(
+                        new_row[key], filename, sheet_name, thumbnail=f"{key} Thumbnail" in headers
+                    )
+                    if thumb_url:
+                        new_row[f"{key} Thumbnail"] = thumb_url
 
         # ========================================================================
         #  ✅ UPDATED: SPECIAL LOGIC for Suivi Sheet - TRAILER SUPPORT + NO EQUIPMENT_LIST
         # ========================================================================
         if sheet_name == "Suivi":
-            # Get machinery type mapping from Machinery_Types sheet
-            machinery_types_sheet = client.open_by_key(SPREADSHEET_ID).worksheet("Machinery_Types")
-            machinery_types_data = machinery_types_sheet.get_all_records()
-            
-            # Build mapping dictionary: Machinery name -> Equipment Type
-            machinery_to_equipment_type = {}
-            for row in machinery_types_data:
-                english_name = row.get('English', '')
-                equipment_mapping = row.get('Equipment_Type_Mapping', '')
-                if english_name and equipment_mapping:
-                    machinery_to_equipment_type[english_name] = equipment_mapping
+            # Machinery name -> Equipment Type (cached Machinery_Types mapping)
+            import reference_data
+            machinery_to_equipment_type = reference_data.machinery_equipment_types()
             
             # ===================================================================
             # STEP 1: Build and append MAIN MACHINERY row
@@ -351,17 +1777,17 @@ def append_row(sheet_name, new_row):
                     main_machinery_row[h] = new_row.get(h, '')
             
             # Handle Machinery Documents PDF
-            if 'Documents' in main_machinery_row and isinstance(main_machinery_row['Documents'], str) and main_machinery_row['Documents'].startswith('data:application/pdf'):
+            if 'Documents' in main_machinery_row and is_pdf_upload(main_machinery_row['Documents']):
                 filename = f"Machinery_{plate_number}_Documents.pdf"
                 main_machinery_row['Documents'] = save_pdf_to_drive(main_machinery_row['Documents'], filename, FOLDERAID_MACHINERY_DOCS)
             
             # Handle Driver 1 Documents PDF
-            if 'Driver 1 Doc' in main_machinery_row and isinstance(main_machinery_row['Driver 1 Doc'], str) and main_machinery_row['Driver 1 Doc'].startswith('data:application/pdf'):
+            if 'Driver 1 Doc' in main_machinery_row and is_pdf_upload(main_machinery_row['Driver 1 Doc']):
                 filename = f"Driver1_{driver1_name}_{plate_number}.pdf"
                 main_machinery_row['Driver 1 Doc'] = save_pdf_to_drive(main_machinery_row['Driver 1 Doc'], filename, FOLDERAID_OPERATORS)
             
             # Handle Driver 2 Documents PDF
-            if 'Driver 2 Doc' in main_machinery_row and isinstance(main_machinery_row['Driver 2 Doc'], str) and main_machinery_row['Driver 2 Doc'].startswith('data:application/pdf'):
+            if 'Driver 2 Doc' in main_machinery_row and is_pdf_upload(main_machinery_row['Driver 2 Doc']):
                 filename = f"Driver2_{driver2_name}_{plate_number}.pdf"
                 main_machinery_row['Driver 2 Doc'] = save_pdf_to_drive(main_machinery_row['Driver 2 Doc'], filename, FOLDERAID_OPERATORS)
             
@@ -374,9 +1800,8 @@ def append_row(sheet_name, new_row):
                     value = current_time
                 row_to_add.append(value)
             
-            # Append main machinery row to Suivi
-            sheet.append_row(row_to_add)
-            print(f"✅ Appended main machinery to Suivi: {plate_number}")
+            # Main machinery row (appended together with its trailer below)
+            rows_to_append = [row_to_add]
             
             # ===================================================================
             # STEP 2: Check if TRAILER exists and append TRAILER row
@@ -416,11 +1841,13 @@ def append_row(sheet_name, new_row):
                         trailer_row[h] = new_row.get('Trailer Documents', '')
                     elif h == 'Driver 1 Doc' or h == 'Driver 2 Doc':
                         trailer_row[h] = ''  # No driver docs for trailer
+                    elif h == SUIVI_PARENT_COLUMN:
+                        trailer_row[h] = plate_number  # ✅ Link to its machine
                     else:
                         trailer_row[h] = ''  # All other fields empty
                 
                 # Handle Trailer Documents PDF upload
-                if 'Documents' in trailer_row and isinstance(trailer_row['Documents'], str) and trailer_row['Documents'].startswith('data:application/pdf'):
+                if 'Documents' in trailer_row and is_pdf_upload(trailer_row['Documents']):
                     trailer_plate = new_row.get('Trailer Plate', 'Unknown')
                     filename = f"Trailer_{trailer_plate}_Documents.pdf"
                     trailer_row['Documents'] = save_pdf_to_drive(trailer_row['Documents'], filename, FOLDERAID_MACHINERY_DOCS)
@@ -428,13 +1855,19 @@ def append_row(sheet_name, new_row):
                 # Prepare trailer row for Suivi sheet
                 trailer_row_to_add = [trailer_row.get(h, '') for h in headers]
                 
-                # Append trailer row immediately after main machinery
-                sheet.append_row(trailer_row_to_add)
+                # Trailer row goes immediately after main machinery
+                rows_to_append.append(trailer_row_to_add)
+            
+            # One append call for the machine and its trailer, so they land together
+            response = sheet.append_rows(rows_to_append)
+            print(f"✅ Appended main machinery to Suivi: {plate_number}")
+            if len(rows_to_append) > 1:
                 print(f"✅ Appended trailer row to Suivi: {new_row.get('Trailer Plate', 'Unknown')}")
             
             # ✅ REMOVED: Equipment_List auto-copy logic (sheet no longer exists)
-            
-            return {"status": "success", "added": new_row, "timestamp": current_time}
+
+            _cache_after_append(sheet_name, headers, rows_to_append, response)
+            return {"status": "success", "added": _public_row(new_row), "timestamp": current_time}
 
         # ---------------------------------------------------
         #  Default logic for other sheets
@@ -447,48 +1880,100 @@ def append_row(sheet_name, new_row):
                 value = current_time
             row_to_add.append(value)
 
-        sheet.append_row(row_to_add)
+        result = {"status": "success", "added": _public_row(new_row), "timestamp": current_time}
+        if upload_errors:
+            result["upload_errors"] = upload_errors
+
+        # ✅ Write-behind: high-volume logs are batched and written shortly after
+        if WRITE_BEHIND_ENABLED and sheet_name in WRITE_BEHIND_SHEETS:
+            result["queued"] = True
+            result["job_id"] = enqueue_append(sheet_name, headers, row_to_add)
+            return result
 
-        return {"status": "success", "added": new_row, "timestamp": current_time}
+        response = sheet.append_row(row_to_add)
+        _cache_after_append(sheet_name, headers, [row_to_add], response)
+
+        return result
 
     except Exception as e:
+        # A partial write may have happened; don't keep serving the old copy
+        invalidate_sheet_cache(sheet_name)
+        invalidate_schema(sheet_name)
         return {"status": "error", "message": str(e)}
 
+# =====================================================
+#  ✅  Edit helpers (shared by update_row / update_rows)
+# =====================================================
+def _upload_edit_photos(sheet_name, headers, updated_data):
+    """Replace photo uploads in an edit with their Drive links (in place)."""
+    for key, value in list(updated_data.items()):
+        if "Photo" in key and is_image_upload(value):
+            filename = f"{sheet_name}_{key}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+            # A thumbnail is only made if the sheet has a "<Photo column> Thumbnail" column
+            updated_data[key], thumb_url = save_photo_to_drive(
+                value, filename, sheet_name, thumbnail=f"{key} Thumbnail" in headers
+            )
+            if thumb_url:
+                updated_data[f"{key} Thumbnail"] = thumb_url
+
+
+def merge_row(headers, current_row, updated_data):
+    """
+    Apply an edit to a row dict (in place).
+
+    Returns:
+        The row's values in header order, ready to write
+    """
+    # Merge updated fields
+    for key, value in updated_data.items():
+        current_row[key] = value
+
+    # Handle "Completed" logic for Maintenance
+    if "Status" in headers and str(updated_data.get("Status", "")).lower() == "completed":
+        completion_date = get_current_time()
+        if "Completion Date" in headers:
+            current_row["Completion Date"] = completion_date
+
+    return [current_row.get(h, "") for h in headers]
+
+
 # =====================================================
 #  ✅ STEP 2: Update Row (Edit) - TRAILER SUPPORT WITH INSERT CAPABILITY
 # =====================================================
 def update_row(sheet_name, row_index, updated_data):
+    with deferred_sharing(), upload_claims() as settle:
+        return settle(_update_row(sheet_name, row_index, updated_data))
+
+
+def _update_row(sheet_name, row_index, updated_data):
+    replaced_files = []  # old documents, deleted once the new row is written
     try:
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet(sheet_name)
-        headers = sheet.row_values(1)
-        
+        schema = get_schema(sheet_name)
+        sheet = schema["worksheet"]
+        headers = schema["headers"]
+
         # Get existing data to merge
-        existing = sheet.row_values(row_index)
-        # Pad existing row if shorter than headers
-        if len(existing) < len(headers):
-            existing += [""] * (len(headers) - len(existing))
-            
-        current_row = dict(zip(headers, existing))
+        if sheet_name == "Suivi":
+            # Machine row + its linked trailer row in one read
+            current_row, trailer_index, trailer_dict = read_suivi_rows(schema, row_index)
+        else:
+            existing = sheet.row_values(row_index)
+            # Pad existing row if shorter than headers
+            if len(existing) < len(headers):
+                existing += [""] * (len(headers) - len(existing))
+                
+            current_row = dict(zip(headers, existing))
 
         # Upload Base64 photos if included (for non-Suivi sheets or general photos)
-        for key, value in updated_data.items():
-            if "Photo" in key and isinstance(value, str) and value.startswith("data:image"):
-                filename = f"{sheet_name}_{key}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                updated_data[key] = save_image_to_drive(value, filename, sheet_name)
+        _upload_edit_photos(sheet_name, headers, updated_data)
 
         # ========================================================================
         #  ✅ NEW: ENHANCED SUIVI EDIT LOGIC WITH TRAILER SUPPORT
         # ========================================================================
         if sheet_name == "Suivi":
-            # Get machinery type mapping
-            machinery_types_sheet = client.open_by_key(SPREADSHEET_ID).worksheet("Machinery_Types")
-            machinery_types_data = machinery_types_sheet.get_all_records()
-            machinery_to_equipment_type = {}
-            for row in machinery_types_data:
-                english_name = row.get('English', '')
-                equipment_mapping = row.get('Equipment_Type_Mapping', '')
-                if english_name and equipment_mapping:
-                    machinery_to_equipment_type[english_name] = equipment_mapping
+            # Machinery name -> Equipment Type (cached Machinery_Types mapping)
+            import reference_data
+            machinery_to_equipment_type = reference_data.machinery_equipment_types()
             
             # ===================================================================
             # STEP A: Determine if this is a main machinery row or trailer row
@@ -503,14 +1988,12 @@ def update_row(sheet_name, row_index, updated_data):
                 print(f"📝 Editing standalone trailer row at {row_index}")
                 
                 # Handle trailer PDF replacement
-                if 'Documents' in updated_data and isinstance(updated_data['Documents'], str):
-                    if updated_data['Documents'].startswith('data:application/pdf'):
-                        old_doc_url = current_row.get('Documents', '')
-                        if old_doc_url:
-                            delete_file_from_drive(old_doc_url)
+                if 'Documents' in updated_data and updated_data['Documents']:
+                    if is_pdf_upload(updated_data['Documents']):
                         trailer_plate = updated_data.get('Plate Number') or current_row.get('Plate Number', 'Unknown')
                         filename = f"Trailer_{trailer_plate}_Documents.pdf"
-                        updated_data['Documents'] = save_pdf_to_drive(updated_data['Documents'], filename, FOLDERAID_MACHINERY_DOCS)
+                        updated_data['Documents'], replaced = replace_pdf_in_drive(current_row.get('Documents', ''), updated_data['Documents'], filename, FOLDERAID_MACHINERY_DOCS)
+                        replaced_files.append(replaced)
                 
                 # Merge updates
                 for key, value in updated_data.items():
@@ -518,10 +2001,12 @@ def update_row(sheet_name, row_index, updated_data):
                 
                 # Write back
                 updated_row_values = [current_row.get(h, "") for h in headers]
-                sheet.update(range_name=f"A{row_index}:Z{row_index}", values=[updated_row_values])
+                sheet.update(range_name=row_range(schema, row_index), values=[updated_row_values])
                 print(f"✅ Updated standalone trailer row at {row_index}")
+                _cache_after_update(sheet_name, row_index, headers, updated_row_values)
+                queue_drive_deletes(replaced_files)
                 
-                return {"status": "success", "updated": current_row}
+                return {"status": "success", "updated": _public_row(current_row)}
             
             else:
                 # ===================================================================
@@ -544,31 +2029,25 @@ def update_row(sheet_name, row_index, updated_data):
                     print(f"🔄 Machinery changed to {new_machinery_type}, Equipment Type updated to {new_equipment_type}")
                 
                 # Handle Machinery Documents PDF replacement
-                if 'Documents' in updated_data and isinstance(updated_data['Documents'], str):
-                    if updated_data['Documents'].startswith('data:application/pdf'):
-                        old_doc_url = current_row.get('Documents', '')
-                        if old_doc_url:
-                            delete_file_from_drive(old_doc_url)
+                if 'Documents' in updated_data and updated_data['Documents']:
+                    if is_pdf_upload(updated_data['Documents']):
                         filename = f"Machinery_{plate_number}_Documents.pdf"
-                        updated_data['Documents'] = save_pdf_to_drive(updated_data['Documents'], filename, FOLDERAID_MACHINERY_DOCS)
+                        updated_data['Documents'], replaced = replace_pdf_in_drive(current_row.get('Documents', ''), updated_data['Documents'], filename, FOLDERAID_MACHINERY_DOCS)
+                        replaced_files.append(replaced)
                 
                 # Handle Driver 1 Documents PDF replacement
-                if 'Driver 1 Doc' in updated_data and isinstance(updated_data['Driver 1 Doc'], str):
-                    if updated_data['Driver 1 Doc'].startswith('data:application/pdf'):
-                        old_doc_url = current_row.get('Driver 1 Doc', '')
-                        if old_doc_url:
-                            delete_file_from_drive(old_doc_url)
+                if 'Driver 1 Doc' in updated_data and updated_data['Driver 1 Doc']:
+                    if is_pdf_upload(updated_data['Driver 1 Doc']):
                         filename = f"Driver1_{driver1_name}_{plate_number}.pdf"
-                        updated_data['Driver 1 Doc'] = save_pdf_to_drive(updated_data['Driver 1 Doc'], filename, FOLDERAID_OPERATORS)
+                        updated_data['Driver 1 Doc'], replaced = replace_pdf_in_drive(current_row.get('Driver 1 Doc', ''), updated_data['Driver 1 Doc'], filename, FOLDERAID_OPERATORS)
+                        replaced_files.append(replaced)
                 
                 # Handle Driver 2 Documents PDF replacement
-                if 'Driver 2 Doc' in updated_data and isinstance(updated_data['Driver 2 Doc'], str):
-                    if updated_data['Driver 2 Doc'].startswith('data:application/pdf'):
-                        old_doc_url = current_row.get('Driver 2 Doc', '')
-                        if old_doc_url:
-                            delete_file_from_drive(old_doc_url)
+                if 'Driver 2 Doc' in updated_data and updated_data['Driver 2 Doc']:
+                    if is_pdf_upload(updated_data['Driver 2 Doc']):
                         filename = f"Driver2_{driver2_name}_{plate_number}.pdf"
-                        updated_data['Driver 2 Doc'] = save_pdf_to_drive(updated_data['Driver 2 Doc'], filename, FOLDERAID_OPERATORS)
+                        updated_data['Driver 2 Doc'], replaced = replace_pdf_in_drive(current_row.get('Driver 2 Doc', ''), updated_data['Driver 2 Doc'], filename, FOLDERAID_OPERATORS)
+                        replaced_files.append(replaced)
                 
                 # Merge updated fields into main machinery row
                 for key, value in updated_data.items():
@@ -576,23 +2055,16 @@ def update_row(sheet_name, row_index, updated_data):
                     if not key.startswith('Trailer ') and key != 'HasTrailer':
                         current_row[key] = value
                 
-                # Write main machinery row back
+                # Main machinery row — written in one call with any trailer change below
                 updated_row_values = [current_row.get(h, "") for h in headers]
-                sheet.update(range_name=f"A{row_index}:Z{row_index}", values=[updated_row_values])
-                print(f"✅ Updated main machinery row at {row_index}")
+                row_writes = [(row_index, updated_row_values)]
+                insert_trailer_at = None
                 
                 # ---------------------------------------------------
-                # SUBSTEP 2: Check for linked trailer row at row_index + 1
+                # SUBSTEP 2: Linked trailer row (already read with the main row)
                 # ---------------------------------------------------
-                try:
-                    next_row_data = sheet.row_values(row_index + 1)
-                    if len(next_row_data) < len(headers):
-                        next_row_data += [""] * (len(headers) - len(next_row_data))
-                    next_row_dict = dict(zip(headers, next_row_data))
-                    next_row_is_trailer = (next_row_dict.get('Machinery', '') == 'Trailer')
-                except:
-                    next_row_is_trailer = False
-                    next_row_dict = None
+                next_row_is_trailer = trailer_index is not None
+                next_row_dict = trailer_dict
                 
                 # ---------------------------------------------------
                 # SUBSTEP 3: Decide what to do with trailer
@@ -606,7 +2078,7 @@ def update_row(sheet_name, row_index, updated_data):
                     # ===================================================================
                     # CASE A: Trailer exists AND user sent trailer data → UPDATE trailer
                     # ===================================================================
-                    print(f"🚛 Trailer row exists at {row_index + 1}, updating it...")
+                    print(f"🚛 Trailer row exists at {trailer_index}, updating it...")
                     
                     trailer_row = next_row_dict
                     
@@ -616,21 +2088,20 @@ def update_row(sheet_name, row_index, updated_data):
                     trailer_row['Insurance'] = updated_data.get('Trailer Insurance', trailer_row.get('Insurance', ''))
                     trailer_row['Technical Inspection'] = updated_data.get('Trailer Technical', trailer_row.get('Technical Inspection', ''))
                     trailer_row['Certificate'] = updated_data.get('Trailer Certificate', trailer_row.get('Certificate', ''))
+                    if SUIVI_PARENT_COLUMN in headers:
+                        trailer_row[SUIVI_PARENT_COLUMN] = plate_number  # follows a plate change
                     
                     # Handle Trailer Documents PDF replacement
-                    if 'Trailer Documents' in updated_data and isinstance(updated_data['Trailer Documents'], str):
-                        if updated_data['Trailer Documents'].startswith('data:application/pdf'):
-                            old_doc_url = trailer_row.get('Documents', '')
-                            if old_doc_url:
-                                delete_file_from_drive(old_doc_url)
+                    if 'Trailer Documents' in updated_data and updated_data['Trailer Documents']:
+                        if is_pdf_upload(updated_data['Trailer Documents']):
                             trailer_plate = trailer_row['Plate Number']
                             filename = f"Trailer_{trailer_plate}_Documents.pdf"
-                            trailer_row['Documents'] = save_pdf_to_drive(updated_data['Trailer Documents'], filename, FOLDERAID_MACHINERY_DOCS)
+                            trailer_row['Documents'], replaced = replace_pdf_in_drive(trailer_row.get('Documents', ''), updated_data['Trailer Documents'], filename, FOLDERAID_MACHINERY_DOCS)
+                            replaced_files.append(replaced)
                     
-                    # Write trailer row back
+                    # Trailer row is written back together with the main row
                     trailer_row_values = [trailer_row.get(h, "") for h in headers]
-                    sheet.update(range_name=f"A{row_index + 1}:Z{row_index + 1}", values=[trailer_row_values])
-                    print(f"✅ Updated trailer row at {row_index + 1}")
+                    row_writes.append((trailer_index, trailer_row_values))
                 
                 elif not next_row_is_trailer and has_trailer_data:
                     # ===================================================================
@@ -665,11 +2136,13 @@ def update_row(sheet_name, row_index, updated_data):
                             trailer_row[h] = updated_data.get('Trailer Documents', '')
                         elif h == 'Driver 1 Doc' or h == 'Driver 2 Doc':
                             trailer_row[h] = ''
+                        elif h == SUIVI_PARENT_COLUMN:
+                            trailer_row[h] = plate_number
                         else:
                             trailer_row[h] = ''
                     
                     # Handle Trailer Documents PDF upload
-                    if 'Documents' in trailer_row and isinstance(trailer_row['Documents'], str) and trailer_row['Documents'].startswith('data:application/pdf'):
+                    if 'Documents' in trailer_row and is_pdf_upload(trailer_row['Documents']):
                         trailer_plate = trailer_row['Plate Number']
                         filename = f"Trailer_{trailer_plate}_Documents.pdf"
                         trailer_row['Documents'] = save_pdf_to_drive(trailer_row['Documents'], filename, FOLDERAID_MACHINERY_DOCS)
@@ -678,16 +2151,22 @@ def update_row(sheet_name, row_index, updated_data):
                     trailer_row_values = [trailer_row.get(h, '') for h in headers]
                     
                     # ✅ INSERT trailer row at row_index + 1 (pushes rows below down)
-                    sheet.insert_row(trailer_row_values, index=row_index + 1)
-                    print(f"✅ Inserted new trailer row at {row_index + 1}")
+                    insert_trailer_at = row_index + 1
+                    row_writes.append((insert_trailer_at, trailer_row_values))
                 
                 elif next_row_is_trailer and not has_trailer_data:
                     # ===================================================================
                     # CASE C: Trailer exists BUT user didn't send trailer data
                     # ===================================================================
-                    # Do nothing (keep existing trailer unchanged)
+                    # Keep the trailer, but let its parent link follow a plate change
                     # Future enhancement: could delete trailer if user explicitly unchecks
-                    print(f"ℹ️ Trailer row exists but no update data sent, leaving unchanged")
+                    new_plate = _plate(current_row)
+                    if SUIVI_PARENT_COLUMN in headers and _parent_plate(next_row_dict) not in ("", new_plate):
+                        next_row_dict[SUIVI_PARENT_COLUMN] = new_plate
+                        row_writes.append((trailer_index, [next_row_dict.get(h, "") for h in headers]))
+                        print(f"🔗 Trailer row at {trailer_index} now points to plate {new_plate}")
+                    else:
+                        print(f"ℹ️ Trailer row exists but no update data sent, leaving unchanged")
                 
                 else:
                     # ===================================================================
@@ -695,30 +2174,38 @@ def update_row(sheet_name, row_index, updated_data):
                     # ===================================================================
                     # Do nothing (normal machinery-only edit)
                     print(f"ℹ️ No trailer involved in this edit")
-                
-                return {"status": "success", "updated": current_row}
+
+                # ---------------------------------------------------
+                # SUBSTEP 4: One API call for the main row and its trailer
+                # ---------------------------------------------------
+                write_rows(schema, row_writes, insert_at=insert_trailer_at)
+                print(f"✅ Updated main machinery row at {row_index}")
+                for idx, _ in row_writes[1:]:
+                    print(f"✅ {'Inserted new' if idx == insert_trailer_at else 'Updated'} trailer row at {idx}")
+
+                if insert_trailer_at is not None:
+                    # Trailer inserts shift rows, so drop the cached copy instead of patching it
+                    invalidate_sheet_cache(sheet_name)
+                else:
+                    for idx, values in row_writes:
+                        _cache_after_update(sheet_name, idx, headers, values)
+                queue_drive_deletes(replaced_files)
+                return {"status": "success", "updated": _public_row(current_row)}
 
         # ========================================================================
         #  Default logic for non-Suivi sheets
         # ========================================================================
         else:
-            # Merge updated fields
-            for key, value in updated_data.items():
-                current_row[key] = value
+            updated_row_values = merge_row(headers, current_row, updated_data)
+            sheet.update(range_name=row_range(schema, row_index), values=[updated_row_values])
+            _cache_after_update(sheet_name, row_index, headers, updated_row_values)
 
-            # Handle "Completed" logic for Maintenance
-            if "Status" in headers and updated_data.get("Status", "").lower() == "completed":
-                completion_date = get_current_time()
-                if "Completion Date" in headers:
-                    current_row["Completion Date"] = completion_date
-
-            updated_row_values = [current_row.get(h, "") for h in headers]
-            sheet.update(range_name=f"A{row_index}:Z{row_index}", values=[updated_row_values])
-
-            return {"status": "success", "updated": current_row}
+            return {"status": "success", "updated": _public_row(current_row)}
 
     except Exception as e:
         print(f"❌ Error in update_row: {str(e)}")
+        invalidate_sheet_cache(sheet_name)
+        invalidate_schema(sheet_name)
         return {"status": "error", "message": str(e)}
 
 # =====================================================
@@ -737,20 +2224,18 @@ def delete_row(sheet_name, row_index):
         JSON response with status
     """
     try:
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet(sheet_name)
-        
+        schema = get_schema(sheet_name)
+        sheet = schema["worksheet"]
+
         # ========================================================================
         #  ✅ NEW: ENHANCED SUIVI DELETE LOGIC WITH TRAILER SUPPORT
         # ========================================================================
         if sheet_name == "Suivi":
-            headers = sheet.row_values(1)
+            headers = schema["headers"]
             
-            # Get the row data before deleting
+            # Get the row data (and its linked trailer row) before deleting
             try:
-                row_data = sheet.row_values(row_index)
-                if len(row_data) < len(headers):
-                    row_data += [""] * (len(headers) - len(row_data))
-                row_dict = dict(zip(headers, row_data))
+                row_dict, trailer_index, trailer_dict = read_suivi_rows(schema, row_index)
             except:
                 return {"status": "error", "message": f"Row {row_index} not found"}
             
@@ -764,15 +2249,13 @@ def delete_row(sheet_name, row_index):
                 # ===================================================================
                 print(f"🗑️ Deleting trailer row at {row_index}")
                 
-                # Delete trailer documents from Drive
-                doc_url = row_dict.get('Documents', '')
-                if doc_url:
-                    delete_file_from_drive(doc_url)
-                    print(f"Deleted trailer documents: {doc_url}")
-                
                 # Delete the trailer row
                 sheet.delete_rows(row_index)
                 print(f"✅ Deleted trailer row at {row_index}")
+                _cache_after_delete(sheet_name, row_index)
+                
+                # Trailer documents are removed from Drive in the background
+                queue_drive_deletes([row_dict.get('Documents', '')])
                 
                 return {"status": "success", "message": f"Trailer row {row_index} deleted successfully"}
             
@@ -782,60 +2265,232 @@ def delete_row(sheet_name, row_index):
                 # ===================================================================
                 print(f"🗑️ Deleting main machinery row at {row_index}")
                 
-                # Step 1: Delete main machinery documents from Drive
+                # Step 1: Collect main machinery documents (deleted from Drive once the rows are gone)
                 doc_fields = ['Documents', 'Driver 1 Doc', 'Driver 2 Doc']
-                for field in doc_fields:
-                    doc_url = row_dict.get(field, '')
-                    if doc_url:
-                        delete_file_from_drive(doc_url)
-                        print(f"Deleted {field}: {doc_url}")
+                doc_urls = [row_dict.get(field, '') for field in doc_fields]
                 
-                # Step 2: Check if there's a linked trailer at row_index + 1
-                trailer_exists = False
-                try:
-                    next_row_data = sheet.row_values(row_index + 1)
-                    if len(next_row_data) < len(headers):
-                        next_row_data += [""] * (len(headers) - len(next_row_data))
-                    next_row_dict = dict(zip(headers, next_row_data))
-                    next_machinery_type = next_row_dict.get('Machinery', '')
-                    
-                    if next_machinery_type == 'Trailer':
-                        trailer_exists = True
-                        trailer_doc_url = next_row_dict.get('Documents', '')
-                        
-                        # Delete trailer documents from Drive
-                        if trailer_doc_url:
-                            delete_file_from_drive(trailer_doc_url)
-                            print(f"Deleted trailer documents: {trailer_doc_url}")
-                        
-                        print(f"🚛 Trailer found at {row_index + 1}, will delete both rows")
-                except:
-                    trailer_exists = False
+                # Step 2: Linked trailer (already read with the main row)
+                trailer_exists = trailer_index is not None
+                if trailer_exists:
+                    doc_urls.append(trailer_dict.get('Documents', ''))
+                    print(f"🚛 Trailer found at {trailer_index}, will delete both rows")
                 
                 # Step 3: Delete rows
                 if trailer_exists:
-                    # Delete both main machinery and trailer (delete higher index first to avoid shifting issues)
-                    sheet.delete_rows(row_index + 1)  # Delete trailer first
-                    print(f"✅ Deleted trailer row at {row_index + 1}")
-                    sheet.delete_rows(row_index)      # Then delete main machinery
-                    print(f"✅ Deleted main machinery row at {row_index}")
-                    
-                    return {"status": "success", "message": f"Main machinery row {row_index} and trailer row {row_index + 1} deleted successfully"}
+                    # Delete both main machinery and trailer in one request
+                    delete_row_ranges(schema, [row_index, trailer_index])
+                    print(f"✅ Deleted main machinery row at {row_index} and trailer row at {trailer_index}")
+                    for idx in sorted((row_index, trailer_index), reverse=True):
+                        _cache_after_delete(sheet_name, idx)
+                    queue_drive_deletes(doc_urls)
+
+                    return {"status": "success", "message": f"Main machinery row {row_index} and trailer row {trailer_index} deleted successfully"}
                 else:
                     # Delete only main machinery
                     sheet.delete_rows(row_index)
                     print(f"✅ Deleted main machinery row at {row_index} (no trailer)")
-                    
+                    _cache_after_delete(sheet_name, row_index)
+                    queue_drive_deletes(doc_urls)
+
                     return {"status": "success", "message": f"Main machinery row {row_index} deleted successfully"}
         
         # ========================================================================
         #  Default logic for other sheets
         # ========================================================================
         else:
-            # For non-Suivi sheets, simple deletion
+            # For non-Suivi sheets, simple deletion; attached photos go as in delete_rows
+            row_dict = read_rows(schema, [row_index])[row_index]
             sheet.delete_rows(row_index)
+            _cache_after_delete(sheet_name, row_index)
+            queue_drive_deletes(_attached_files(row_dict))
             return {"status": "success", "message": f"Row {row_index} deleted successfully"}
         
     except Exception as e:
         print(f"❌ Error in delete_row: {str(e)}")
+        invalidate_sheet_cache(sheet_name)
+        invalidate_schema(sheet_name)
         return {"status": "error", "message": str(e)}
+
+# =====================================================
+#  ✅  Bulk delete (many rows, one request)
+# =====================================================
+MAX_BULK_DELETE = 2000
+_DRIVE_URL = re.compile(r"https://drive\.google\.com/[^\s\"',]+")
+
+
+def _attached_files(row):
+    """Drive links of the photos / documents stored in a row."""
+    urls = []
+    for key, value in row.items():
+        if not isinstance(value, str) or "drive.google.com" not in value:
+            continue
+        if "Photo" in key or key in PDF_UPLOAD_FIELDS or key == "Checklist Data":
+            # Checklist Data is JSON with a photo/thumb link per item
+            urls.extend(_DRIVE_URL.findall(value))
+    return _without_indexed_thumbs(urls)
+
+
+def _verified_trailers(schema, rows):
+    """
+    Trailer rows linked to freshly read Suivi rows, picked and checked
+    the same way as in read_suivi_rows. If the cached index turns out
+    to be stale it is rebuilt once.
+
+    Args:
+        rows: {row_index: row_dict} read from the sheet
+
+    Returns:
+        {trailer_row_index: trailer_dict}
+    """
+    for attempt in range(2):
+        candidates = {
+            idx: _linked_trailer(schema, idx)
+            for idx, row in rows.items() if not _is_trailer(row)
+        }
+        fresh = dict(rows)
+        unread = {
+            i for _, indexed_idx, next_idx in candidates.values()
+            for i in (indexed_idx, next_idx) if i is not None and i not in rows
+        }
+        fresh.update(read_rows(schema, unread))
+
+        stale = False
+        trailers = {}
+        for idx, (cached_plate, indexed_idx, next_idx) in candidates.items():
+            trailer_idx, cache_ok = _pick_trailer(rows[idx], fresh, cached_plate, indexed_idx, next_idx)
+            stale = stale or not cache_ok
+            if trailer_idx is not None:
+                trailers[trailer_idx] = fresh[trailer_idx]
+        if not stale or attempt == 1:
+            return trailers
+        invalidate_sheet_cache("Suivi")
+
+
+def delete_rows(sheet_name, row_indexes):
+    """
+    Delete many rows at once: rows are read in one batch_get (for their
+    attached files), merged into contiguous runs and removed with one
+    batchUpdate; the files are handed to the background Drive cleanup.
+    On Suivi, a machine's linked trailer row goes with it once the link
+    has been confirmed against the sheet.
+
+    Returns:
+        {"status", "deleted": [row indexes], "skipped": [{"row", "reason"}], "message"}
+    """
+    try:
+        row_indexes = sorted({int(i) for i in row_indexes})
+    except (TypeError, ValueError):
+        return {"status": "error", "message": "Row indexes must be integers"}
+    if not row_indexes or row_indexes[0] < 2:
+        return {"status": "error", "message": "Row indexes must be 2 or more (row 1 is the header)"}
+    if len(row_indexes) > MAX_BULK_DELETE:
+        return {"status": "error", "message": f"At most {MAX_BULK_DELETE} rows per request"}
+
+    try:
+        schema = get_schema(sheet_name)
+
+        # Rows past the data (or the grid) are reported, not deleted
+        skipped = []
+        last_row = max(len(get_cached_records(sheet_name)) + 1, schema["worksheet"].row_count)
+        for idx in row_indexes:
+            if idx > last_row:
+                skipped.append({"row": idx, "reason": "Row does not exist"})
+        row_indexes = [idx for idx in row_indexes if idx <= last_row]
+
+        # Read the rows first to find their files (and Suivi trailers)
+        rows = read_rows(schema, row_indexes)
+        for idx, row in sorted(rows.items()):
+            if not any(str(v).strip() for v in row.values()):
+                skipped.append({"row": idx, "reason": "Row is empty"})
+                del rows[idx]
+        if not rows:
+            return {"status": "error", "skipped": sorted(skipped, key=lambda item: item["row"]), "message": "None of the rows exist"}
+        if sheet_name == "Suivi":
+            rows.update(_verified_trailers(schema, rows))
+        row_indexes = sorted(rows)
+        file_urls = []
+        for row in rows.values():
+            file_urls.extend(_attached_files(row))
+
+        runs = delete_row_ranges(schema, row_indexes)
+        print(f"✅ Deleted {len(row_indexes)} rows from {sheet_name} in {len(runs)} ranges")
+        for idx in reversed(row_indexes):
+            _cache_after_delete(sheet_name, idx)
+
+        queue_drive_deletes(file_urls)
+        return {
+            "status": "success",
+            "deleted": row_indexes,
+            "skipped": sorted(skipped, key=lambda item: item["row"]),
+            "message": f"{len(row_indexes)} rows deleted successfully"
+        }
+
+    except Exception as e:
+        print(f"❌ Error in delete_rows: {str(e)}")
+        invalidate_sheet_cache(sheet_name)
+        invalidate_schema(sheet_name)
+        return {"status": "error", "message": str(e)}
+
+
+# =====================================================
+#  🆕 Bulk edit — many rows, one read and one write
+# =====================================================
+MAX_BULK_EDIT = 500
+
+
+def update_rows(sheet_name, edits):
+    """
+    Apply many edits at once: the rows are read with one batch_get,
+    merged like update_row (incl. Completed → Completion Date) and
+    written back with one batch_update.
+    Suivi is not supported (its edits may insert trailer rows).
+
+    Args:
+        edits: [(row_index, updated_data)] — several edits of the same row are applied in order
+
+    Returns:
+        {"status", "updated": [row indexes], "message"}
+    """
+    if sheet_name == "Suivi":
+        return {"status": "error", "message": "Bulk edit is not available for Suivi"}
+    if not edits:
+        return {"status": "error", "message": "No rows to update"}
+    if len(edits) > MAX_BULK_EDIT:
+        return {"status": "error", "message": f"At most {MAX_BULK_EDIT} rows per request"}
+    for row_index, updated_data in edits:
+        if not isinstance(row_index, int) or isinstance(row_index, bool) or row_index < 2:
+            return {"status": "error", "message": "Row indexes must be integers of 2 or more (row 1 is the header)"}
+        if not isinstance(updated_data, dict):
+            return {"status": "error", "message": f"Row {row_index}: data must be an object"}
+
+    with deferred_sharing(), upload_claims() as settle:
+        try:
+            schema = get_schema(sheet_name)
+            headers = schema["headers"]
+
+            # Read the affected rows (one call)
+            row_indexes = sorted({row_index for row_index, _ in edits})
+            current = read_rows(schema, row_indexes)
+
+            values_by_row = {}
+            for row_index, updated_data in edits:
+                _upload_edit_photos(sheet_name, headers, updated_data)
+                values_by_row[row_index] = merge_row(headers, current[row_index], updated_data)
+
+            row_writes = sorted(values_by_row.items())
+            write_rows(schema, row_writes)
+            print(f"✅ Updated {len(row_writes)} rows in {sheet_name}")
+            for row_index, values in row_writes:
+                _cache_after_update(sheet_name, row_index, headers, values)
+
+            return settle({
+                "status": "success",
+                "updated": row_indexes,
+                "message": f"{len(row_indexes)} rows updated successfully"
+            })
+
+        except Exception as e:
+            print(f"❌ Error in update_rows: {str(e)}")
+            invalidate_sheet_cache(sheet_name)
+            invalidate_schema(sheet_name)
+            return settle({"status": "error", "message": str(e)})
@@ -0,0 +1,159 @@
+# backend/upload_index.py
+# ==========================================
+# Content-addressed index of Drive uploads
+# (disable with UPLOAD_DEDUP=0)
+# ==========================================
+#
+# Maps the SHA-256 of an uploaded file (as the client sent
+# it) and its destination folder to the Drive file that
+# was created for it. Resubmitting the same photo or PDF
+# reuses that file instead of uploading a copy.
+#
+# Because one Drive file can end up referenced by several
+# rows, every reuse takes a reference; a file is only
+# really deleted from Drive once its last reference is
+# released. Files uploaded before this index existed are
+# unknown here and are deleted as before.
+
+import os
+import sqlite3
+import hashlib
+import threading
+
+UPLOAD_DEDUP_ENABLED = os.environ.get("UPLOAD_DEDUP", "1").lower() in ("1", "true", "yes")
+UPLOAD_INDEX_PATH = os.environ.get(
+    "UPLOAD_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload_index.db")
+)
+
+_local = threading.local()
+
+
+def _conn():
+    """One SQLite connection per thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(UPLOAD_INDEX_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " key TEXT PRIMARY KEY, file_id TEXT NOT NULL, url TEXT NOT NULL,"
+            " thumb TEXT NOT NULL DEFAULT '', refs INTEGER NOT NULL DEFAULT 1)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_file ON uploads (file_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_thumb ON uploads (thumb)")
+        _local.conn = conn
+    return conn
+
+
+def content_key(stream, scope):
+    """
+    Hash a seekable stream (rewound afterwards).
+
+    Args:
+        stream: file content
+        scope: destination folder — the same bytes in another folder are a different file
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return f"{scope}:{digest.hexdigest()}"
+
+
+# =====================================================
+#  ✅  Lookup / record
+# =====================================================
+def lookup(key):
+    """
+    Returns:
+        (file_id, url, thumb) of a previous upload of the same content, or None
+    """
+    try:
+        row = _conn().execute("SELECT file_id, url, thumb FROM uploads WHERE key = ?", (key,)).fetchone()
+        return tuple(row) if row else None
+    except Exception as e:
+        print(f"Upload index read error: {e}")
+        return None
+
+
+def thumb_of(file_id):
+    """Thumbnail link recorded with an indexed upload ("" if none or not indexed)."""
+    try:
+        row = _conn().execute("SELECT thumb FROM uploads WHERE file_id = ?", (file_id,)).fetchone()
+        return row[0] if row else ""
+    except Exception as e:
+        print(f"Upload index read error: {e}")
+        return ""
+
+
+def is_indexed_thumb(url):
+    """
+    True if the link is the thumbnail of an indexed upload. Such a
+    thumbnail shares its photo's references and is deleted with it.
+    """
+    try:
+        return _conn().execute("SELECT 1 FROM uploads WHERE thumb = ? AND thumb != ''", (url,)).fetchone() is not None
+    except Exception as e:
+        print(f"Upload index read error: {e}")
+        # Unknown: keep the file rather than risk deleting a shared one
+        return True
+
+
+def acquire(key):
+    """Take one more reference on an indexed upload (it is being reused)."""
+    try:
+        conn = _conn()
+        with conn:
+            conn.execute("UPDATE uploads SET refs = refs + 1 WHERE key = ?", (key,))
+    except Exception as e:
+        print(f"Upload index write error: {e}")
+
+
+def remember(key, file_id, url, thumb=""):
+    """Index a fresh upload. If another request indexed the same content first, keep that one."""
+    try:
+        conn = _conn()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO uploads (key, file_id, url, thumb) VALUES (?, ?, ?, ?)",
+                (key, file_id, url, thumb or ""),
+            )
+    except Exception as e:
+        print(f"Upload index write error: {e}")
+
+
+def forget(key):
+    """Drop an entry whose Drive file no longer exists."""
+    try:
+        conn = _conn()
+        with conn:
+            conn.execute("DELETE FROM uploads WHERE key = ?", (key,))
+    except Exception as e:
+        print(f"Upload index write error: {e}")
+
+
+def release(file_id):
+    """
+    Release one reference on a Drive file that a row no longer uses.
+
+    Returns:
+        True if the file can be deleted from Drive (last reference, or
+        not indexed at all), False if other rows still point to it or
+        the index could not be read
+    """
+    try:
+        conn = _conn()
+        with conn:
+            row = conn.execute("SELECT key, refs FROM uploads WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None:
+                return True
+            key, refs = row
+            if refs > 1:
+                conn.execute("UPDATE uploads SET refs = refs - 1 WHERE key = ?", (key,))
+                return False
+            conn.execute("DELETE FROM uploads WHERE key = ?", (key,))
+            return True
+    except Exception as e:
+        print(f"Upload index write error: {e}")
+        return False
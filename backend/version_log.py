@@ -0,0 +1,182 @@
+# backend/version_log.py
+# ==========================================
+# Worksheet versions & change log, shared by
+# every gunicorn worker on the host
+# (see "Worksheet versions" in sheets_service)
+# ==========================================
+#
+# A client polling /api/<sheet>?since= can land on any
+# worker, so versions can't be counted per process: the
+# version number, the content hash and the row-level
+# change log of each sheet live in a local SQLite file.
+# The epoch is created with the file, so versions only
+# start over when the file does.
+#
+# This module only keeps the log; sheets_service keeps
+# its in-memory copies in step with it.
+
+import os
+import json
+import uuid
+import sqlite3
+import threading
+
+SHEET_VERSIONS_PATH = os.environ.get(
+    "SHEET_VERSIONS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sheet_versions.db")
+)
+SHEET_CHANGE_LOG_SIZE = int(os.environ.get("SHEET_CHANGE_LOG_SIZE", "500"))
+
+_local = threading.local()
+_epoch = None
+
+
+def _conn():
+    """One SQLite connection per thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SHEET_VERSIONS_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sheet_versions ("
+            " sheet TEXT PRIMARY KEY, version INTEGER NOT NULL, hash TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sheet_changes ("
+            " sheet TEXT NOT NULL, version INTEGER NOT NULL, op TEXT NOT NULL,"
+            " rowindex INTEGER, record TEXT, PRIMARY KEY (sheet, version))"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS log_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO log_meta (key, value) VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],)
+            )
+        _local.conn = conn
+    return conn
+
+
+def epoch():
+    global _epoch
+    if _epoch is None:
+        _epoch = _conn().execute("SELECT value FROM log_meta WHERE key = 'epoch'").fetchone()[0]
+    return _epoch
+
+
+def _current(conn, sheet_name):
+    row = conn.execute("SELECT version, hash FROM sheet_versions WHERE sheet = ?", (sheet_name,)).fetchone()
+    return row if row is not None else (0, None)
+
+
+# =====================================================
+#  ✅  Reads
+# =====================================================
+def current(sheet_name):
+    """(version, content hash or None) of a sheet."""
+    return _current(_conn(), sheet_name)
+
+
+def sheets():
+    return [name for (name,) in _conn().execute("SELECT sheet FROM sheet_versions")]
+
+
+def changes_since(sheet_name, since):
+    """
+    The logged changes after version `since`, oldest first, as
+    (version, op, rowindex, record) — or None if `since` is unknown or
+    the log no longer goes back that far.
+    """
+    conn = _conn()
+    version, _ = _current(conn, sheet_name)
+    if since > version:
+        return None
+    rows = conn.execute(
+        "SELECT version, op, rowindex, record FROM sheet_changes"
+        " WHERE sheet = ? AND version > ? ORDER BY version",
+        (sheet_name, since),
+    ).fetchall()
+    # The log must cover every version after `since`
+    if len(rows) != version - since:
+        return None
+    return [(v, op, rowindex, json.loads(record) if record else None) for v, op, rowindex, record in rows]
+
+
+# =====================================================
+#  ✅  Writes
+# =====================================================
+def _write(conn, sheet_name, version, digest, changes):
+    conn.executemany(
+        "INSERT OR REPLACE INTO sheet_changes (sheet, version, op, rowindex, record) VALUES (?, ?, ?, ?, ?)",
+        [
+            (sheet_name, version - len(changes) + n + 1, op, rowindex,
+             json.dumps(record, default=str) if record is not None else None)
+            for n, (op, rowindex, record) in enumerate(changes)
+        ],
+    )
+    conn.execute(
+        "DELETE FROM sheet_changes WHERE sheet = ? AND version <= ?",
+        (sheet_name, version - SHEET_CHANGE_LOG_SIZE),
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO sheet_versions (sheet, version, hash) VALUES (?, ?, ?)",
+        (sheet_name, version, digest),
+    )
+
+
+def record(sheet_name, changes, expected=None, digest=None):
+    """
+    Log changes to a sheet: [(op, rowindex, record)] with op "add",
+    "update", "delete" or "reset".
+
+    Args:
+        expected: version the caller's copy was at. If another process
+                  logged something since, a single "reset" is logged
+                  instead — the changes can't be replayed on that copy.
+        digest: content hash after the changes
+
+    Returns:
+        (new version, True if the changes were logged as given)
+    """
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")  # no other process logs in between
+    try:
+        version, _ = _current(conn, sheet_name)
+        in_step = expected is None or version == expected
+        if not in_step or any(op == "reset" for op, _, _ in changes):
+            changes, digest = [("reset", None, None)], None
+        version += len(changes)
+        _write(conn, sheet_name, version, digest, changes)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version, in_step
+
+
+def store_hash(sheet_name, digest, expected=None):
+    """
+    Check freshly fetched content against the last known hash; a
+    difference (a change made outside the app) is logged as a "reset".
+
+    Args:
+        expected: version read before the fetch
+
+    Returns:
+        the version the content is at, or None if something was logged
+        since `expected` — the fetched rows may predate it
+    """
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version, known = _current(conn, sheet_name)
+        if expected is not None and version != expected:
+            conn.rollback()
+            return None
+        if known != digest:
+            changes = [("reset", None, None)] if known is not None else []
+            version += len(changes)
+            _write(conn, sheet_name, version, digest, changes)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version
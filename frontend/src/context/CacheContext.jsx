@@ -6,6 +6,8 @@ import { fetchWithAuth } from "../api/api";
  * CacheContext
  * - Caches Suivi (machinery tracking data) and Usernames (safe list) in memory + localStorage
  * - TTL-based refresh (default 5 minutes)
+ * - Suivi refreshes are delta syncs: /api/suivi?since=<version> returns only
+ *   the rows added / changed / removed since the version we already hold
  * - Exposes helpers:
  *    getEquipment(), forceRefreshEquipment()
  *    getUsernames(), forceRefreshUsernames()
@@ -26,10 +28,29 @@ const CACHE_TTL_MS = 5 * 60 * 1000; // 5 minutes
 const LS_KEYS = {
   equipment: "cache_equipment_v2", // Changed from v1 to v2 to invalidate old Equipment_List cache
   equipment_ts: "cache_equipment_ts_v2",
+  equipment_version: "cache_equipment_version_v2",
   usernames: "cache_usernames_v1",
   usernames_ts: "cache_usernames_ts_v1",
 };
 
+// Replay backend change entries (in order) on top of the rows we hold.
+// A delete shifts every later row up by one, like it does in the sheet.
+function applyRowChanges(rows, changes) {
+  let next = [...(rows || [])];
+  for (const change of changes) {
+    if (change.op === "add") {
+      next.push(change.row);
+    } else if (change.op === "update") {
+      next = next.map((r) => (r.rowindex === change.row.rowindex ? change.row : r));
+    } else if (change.op === "delete") {
+      next = next
+        .filter((r) => r.rowindex !== change.rowindex)
+        .map((r) => (r.rowindex > change.rowindex ? { ...r, rowindex: r.rowindex - 1 } : r));
+    }
+  }
+  return next;
+}
+
 export function CacheProvider({ children }) {
   const [equipment, setEquipment] = useState(() => {
     try {
@@ -61,10 +82,15 @@ export function CacheProvider({ children }) {
   };
 
   // Internal: save to localStorage + state
-  const persistEquipment = (arr) => {
+  const persistEquipment = (arr, version) => {
     try {
       localStorage.setItem(LS_KEYS.equipment, JSON.stringify(arr || []));
       localStorage.setItem(LS_KEYS.equipment_ts, String(Date.now()));
+      if (version) {
+        localStorage.setItem(LS_KEYS.equipment_version, version);
+      } else {
+        localStorage.removeItem(LS_KEYS.equipment_version);
+      }
     } catch (e) {
       // ignore storage errors
       console.warn("Cache: failed to persist equipment", e);
@@ -93,11 +119,27 @@ export function CacheProvider({ children }) {
     try {
       setLoadingEquipment(true);
       // ✅ CHANGED: Now fetching from /api/suivi instead of /api/equipment
-      const response = await fetchWithAuth("/api/suivi");
+      // Ask only for changes when we already hold a versioned copy
+      const version = localStorage.getItem(LS_KEYS.equipment_version);
+      const path = version && equipment && equipment.length
+        ? `/api/suivi?since=${encodeURIComponent(version)}`
+        : "/api/suivi";
+      const response = await fetchWithAuth(path);
+      if (!response) return;
       const data = await response.json();
       // Expecting array of rows from Suivi sheet:
       // [{ "Status": "...", "Machinery": "...", "Model / Type": "...", "Plate Number": "...", "Driver 1": "...", "Driver 2": "...", ... }, ...]
-      persistEquipment(Array.isArray(data) ? data : []);
+      // or, for ?since=, { version, full, rows } / { version, full: false, changes }
+      if (Array.isArray(data)) {
+        const etag = (response.headers.get("ETag") || "").replace(/"/g, "");
+        persistEquipment(data, etag);
+      } else if (data && data.full && Array.isArray(data.rows)) {
+        persistEquipment(data.rows, data.version);
+      } else if (data && Array.isArray(data.changes)) {
+        persistEquipment(applyRowChanges(equipment, data.changes), data.version);
+      } else {
+        persistEquipment([]);
+      }
     } catch (err) {
       console.error("Cache: refreshEquipment failed (Suivi endpoint)", err);
     } finally {
@@ -640,7 +640,7 @@ export default function ChecklistHistory() {
                                               className="inline-block relative group"
                                             >
                                               <img
-                                                src={getThumbnailUrl(itemData.photo)}
+                                                src={getThumbnailUrl(itemData.thumb || itemData.photo)}
                                                 alt="Item photo"
                                                 className="w-24 h-24 object-cover rounded-lg border border-gray-600 group-hover:border-purple-500 group-hover:scale-110 transition-all duration-200 shadow-lg"
                                               />
@@ -34,6 +34,15 @@ const getThumbnailUrl = (url) => {
   return url;
 };
 
+// Filter key -> Cleaning_Log column
+const FILTER_COLUMNS = {
+  model: "Model / Type",
+  plate: "Plate Number",
+  driver: "Driver",
+  cleanedBy: "Cleaned By",
+  cleaningType: "Cleaning Type",
+};
+
 /* ---------------- Component ---------------- */
 
 export default function CleaningHistory() {
@@ -43,6 +52,9 @@ export default function CleaningHistory() {
   const { t } = useTranslation();
 
   const [rows, setRows] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [options, setOptions] = useState({});
+  const [reloadKey, setReloadKey] = useState(0);
   const [loading, setLoading] = useState(true);
   const [expandedIndex, setExpandedIndex] = useState(null);
   const [deleteMode, setDeleteMode] = useState(false);
@@ -63,42 +75,6 @@ export default function CleaningHistory() {
   // ✅ Check if user can delete (Centralized from roles.js)
   const canDelete = canUserPerformAction(user?.role, 'CLEANINGHISTORY_DELETE');
 
-  /* ---------------- Load Cleaning Log ---------------- */
-
-  useEffect(() => {
-    async function load() {
-      setLoading(true);
-      try {
-        const token = localStorage.getItem("token");
-        const res = await fetch(`${CONFIG.BACKEND_URL}/api/Cleaning_Log`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        const data = await res.json();
-        if (Array.isArray(data)) {
-          // ✅ Step 1: Assign __row_index based on ORIGINAL sheet position (for delete/edit)
-          const withIndex = data.map((row, i) => ({
-            ...row,
-            __row_index: i + 2, // +2 because row 1 is headers, data starts at row 2
-          }));
-          
-          // ✅ Step 2: Sort by Date field for display (newest first)
-          const sorted = [...withIndex].sort((a, b) => {
-            const dateA = new Date(a.Date);
-            const dateB = new Date(b.Date);
-            return dateB - dateA; // Newest first
-          });
-          
-          setRows(sorted);
-        }
-      } catch (err) {
-        console.error("Error loading cleaning history:", err);
-      } finally {
-        setLoading(false);
-      }
-    }
-    load();
-  }, []);
-
   /* ---------------- ✅ FIX ADDED: Ensure Equipment Cache is Loaded ---------------- */
   // Without this, Driver role sees empty results on first load because
   // driverAllowedPlates returns [] when cache hasn't loaded yet,
@@ -131,83 +107,104 @@ export default function CleaningHistory() {
 
   /* ---------------- Filter Options ---------------- */
 
-  const modelOptions = useMemo(
-    () =>
-      Array.from(
-        new Set(rows.map((r) => r["Model / Type"]).filter(Boolean))
-      ).sort(),
-    [rows]
-  );
+  // Distinct column values from the server, so the whole log isn't downloaded
+  useEffect(() => {
+    async function loadOptions() {
+      try {
+        const params = new URLSearchParams({ limit: 1 });
+        Object.values(FILTER_COLUMNS).forEach((column) =>
+          params.append("options", column)
+        );
+        const token = localStorage.getItem("token");
+        const res = await fetch(
+          `${CONFIG.BACKEND_URL}/api/Cleaning_Log?${params}`,
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+        const data = await res.json();
+        if (data?.options) setOptions(data.options);
+      } catch (err) {
+        console.error("Error loading cleaning filters:", err);
+      }
+    }
+    loadOptions();
+  }, []);
 
-  const plateOptions = useMemo(
-    () =>
-      Array.from(
-        new Set(rows.map((r) => r["Plate Number"]).filter(Boolean))
-      ).sort(),
-    [rows]
-  );
+  const modelOptions = options[FILTER_COLUMNS.model] || [];
+  const plateOptions = options[FILTER_COLUMNS.plate] || [];
+  const driverOptions = options[FILTER_COLUMNS.driver] || [];
+  const cleanedByOptions = options[FILTER_COLUMNS.cleanedBy] || [];
+  const cleaningTypeOptions = options[FILTER_COLUMNS.cleaningType] || [];
 
-  const driverOptions = useMemo(
-    () =>
-      Array.from(new Set(rows.map((r) => r["Driver"]).filter(Boolean))).sort(),
-    [rows]
-  );
+  /* ---------------- Load Cleaning Log (one page, filtered on the server) ---------------- */
 
-  const cleanedByOptions = useMemo(
-    () =>
-      Array.from(
-        new Set(rows.map((r) => r["Cleaned By"]).filter(Boolean))
-      ).sort(),
-    [rows]
-  );
+  useEffect(() => {
+    let cancelled = false;
 
-  const cleaningTypeOptions = useMemo(
-    () =>
-      Array.from(
-        new Set(rows.map((r) => r["Cleaning Type"]).filter(Boolean))
-      ).sort(),
-    [rows]
-  );
+    async function load() {
+      try {
+        const params = new URLSearchParams({
+          limit: itemsPerPage,
+          cursor: (currentPage - 1) * itemsPerPage,
+          sort: "-Date",
+        });
+        Object.entries(FILTER_COLUMNS).forEach(([key, column]) => {
+          if (filters[key]) params.append(column, filters[key]);
+        });
+        if (filters.from) params.append("from", filters.from);
+        if (filters.to) params.append("to", filters.to);
+
+        // ✅ Drivers only get the rows of their own plates
+        if (Array.isArray(driverAllowedPlates)) {
+          const plates = filters.plate
+            ? driverAllowedPlates.filter((p) => p === filters.plate)
+            : driverAllowedPlates;
+          if (plates.length === 0) {
+            setRows([]);
+            setTotal(0);
+            return;
+          }
+          params.delete(FILTER_COLUMNS.plate);
+          plates.forEach((p) => params.append(FILTER_COLUMNS.plate, p));
+        }
 
-  /* ---------------- Apply Filters ---------------- */
-
-  const filteredRows = useMemo(() => {
-    return rows.filter((r) => {
-      const date = r["Date"];
-      const model = r["Model / Type"] || "";
-      const plate = r["Plate Number"] || "";
-      const driver = r["Driver"] || "";
-      const cleanedBy = r["Cleaned By"] || "";
-      const cleaningType = r["Cleaning Type"] || "";
-
-      if (
-        user?.role === "Driver" &&
-        Array.isArray(driverAllowedPlates) &&
-        !driverAllowedPlates.includes(plate)
-      ) {
-        return false;
-      }
+        const token = localStorage.getItem("token");
+        const res = await fetch(
+          `${CONFIG.BACKEND_URL}/api/Cleaning_Log?${params}`,
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+        const data = await res.json();
+        if (cancelled || !Array.isArray(data?.rows)) return;
 
-      if (filters.model && model !== filters.model) return false;
-      if (filters.plate && plate !== filters.plate) return false;
-      if (filters.driver && driver !== filters.driver) return false;
-      if (filters.cleanedBy && cleanedBy !== filters.cleanedBy) return false;
-      if (filters.cleaningType && cleaningType !== filters.cleaningType)
-        return false;
+        // Page emptied by a delete: step back to the new last page
+        if (data.rows.length === 0 && currentPage > 1) {
+          setCurrentPage(Math.max(1, Math.ceil(data.total / itemsPerPage)));
+          return;
+        }
 
-      if (filters.from && date < filters.from) return false;
-      if (filters.to && date > filters.to) return false;
+        // ✅ rowindex is the row's sheet position (for delete/edit)
+        setRows(data.rows.map((row) => ({ ...row, __row_index: row.rowindex })));
+        setTotal(data.total);
+      } catch (err) {
+        console.error("Error loading cleaning history:", err);
+      } finally {
+        if (!cancelled) setLoading(false);
+      }
+    }
+    load();
 
-      return true;
-    });
-  }, [rows, filters, user, driverAllowedPlates]);
+    return () => {
+      cancelled = true;
+    };
+  }, [filters, currentPage, driverAllowedPlates, reloadKey]);
 
-  const totalPages = Math.ceil(filteredRows.length / itemsPerPage);
+  const totalPages = Math.ceil(total / itemsPerPage);
   const startIndex = (currentPage - 1) * itemsPerPage;
-  const paginatedRows = filteredRows.slice(
-    startIndex,
-    startIndex + itemsPerPage
-  );
+  const paginatedRows = rows;
+
+  const updateFilter = (key, value) => {
+    setFilters((f) => ({ ...f, [key]: value }));
+    setCurrentPage(1);
+  };
 
   const resetFilters = () => {
     setFilters({
@@ -225,8 +222,7 @@ export default function CleaningHistory() {
   /* ---------------- Delete ---------------- */
 
   const handleDelete = async (rowIndexInPage) => {
-    const actualIndex = startIndex + rowIndexInPage;
-    const rowToDelete = filteredRows[actualIndex];
+    const rowToDelete = rows[rowIndexInPage];
 
     const confirmDelete = window.confirm(
       t("maintenance.history.deleteConfirm")
@@ -245,9 +241,8 @@ export default function CleaningHistory() {
       );
       const result = await res.json();
       if (result.status === "success") {
-        setRows((prev) =>
-          prev.filter((r) => r.__row_index !== rowToDelete.__row_index)
-        );
+        // Rows below it moved up a line: reload the page
+        setReloadKey((k) => k + 1);
         alert(t("maintenance.history.deleteSuccess"));
       } else {
         alert(t("maintenance.history.deleteError"));
@@ -305,33 +300,33 @@ export default function CleaningHistory() {
         {/* Filters */}
         <div className="bg-gray-800/40 border border-gray-700 rounded-2xl p-4 mb-8">
           <div className="grid md:grid-cols-7 sm:grid-cols-2 gap-4">
-            <select value={filters.model} onChange={(e) => setFilters(f => ({ ...f, model: e.target.value }))} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
+            <select value={filters.model} onChange={(e) => updateFilter("model", e.target.value)} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
               <option value="">{t("cleaning.history.filters.model")}</option>
               {modelOptions.map(m => <option key={m}>{m}</option>)}
             </select>
 
-            <select value={filters.plate} onChange={(e) => setFilters(f => ({ ...f, plate: e.target.value }))} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
+            <select value={filters.plate} onChange={(e) => updateFilter("plate", e.target.value)} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
               <option value="">{t("cleaning.history.filters.plate")}</option>
               {plateOptions.map(p => <option key={p}>{p}</option>)}
             </select>
 
-            <select value={filters.driver} onChange={(e) => setFilters(f => ({ ...f, driver: e.target.value }))} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
+            <select value={filters.driver} onChange={(e) => updateFilter("driver", e.target.value)} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
               <option value="">{t("cleaning.history.filters.driver")}</option>
               {driverOptions.map(d => <option key={d}>{d}</option>)}
             </select>
 
-            <select value={filters.cleanedBy} onChange={(e) => setFilters(f => ({ ...f, cleanedBy: e.target.value }))} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
+            <select value={filters.cleanedBy} onChange={(e) => updateFilter("cleanedBy", e.target.value)} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
               <option value="">{t("cleaning.history.filters.cleanedBy")}</option>
               {cleanedByOptions.map(c => <option key={c}>{c}</option>)}
             </select>
 
-            <select value={filters.cleaningType} onChange={(e) => setFilters(f => ({ ...f, cleaningType: e.target.value }))} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
+            <select value={filters.cleaningType} onChange={(e) => updateFilter("cleaningType", e.target.value)} className="p-2 rounded-lg bg-gray-900 border border-gray-700">
               <option value="">{t("cleaning.history.filters.cleaningType")}</option>
               {cleaningTypeOptions.map(c => <option key={c}>{c}</option>)}
             </select>
 
-            <input type="date" value={filters.from} onChange={(e) => setFilters(f => ({ ...f, from: e.target.value }))} className="p-2 rounded-lg bg-gray-900 border border-gray-700" />
-            <input type="date" value={filters.to} onChange={(e) => setFilters(f => ({ ...f, to: e.target.value }))} className="p-2 rounded-lg bg-gray-900 border border-gray-700" />
+            <input type="date" value={filters.from} onChange={(e) => updateFilter("from", e.target.value)} className="p-2 rounded-lg bg-gray-900 border border-gray-700" />
+            <input type="date" value={filters.to} onChange={(e) => updateFilter("to", e.target.value)} className="p-2 rounded-lg bg-gray-900 border border-gray-700" />
           </div>
 
           <div className="flex justify-between mt-4">
@@ -451,7 +446,7 @@ export default function CleaningHistory() {
                                     className="relative group inline-block"
                                   >
                                     <img
-                                      src={getThumbnailUrl(r[field])}
+                                      src={getThumbnailUrl(r[`${field} Thumbnail`] || r[field])}
                                       alt={field}
                                       className="h-20 w-20 rounded-lg border border-gray-600"
                                     />
@@ -541,7 +536,7 @@ export default function CleaningHistory() {
                               className="relative group block"
                             >
                               <img
-                                src={getThumbnailUrl(r[field])}
+                                src={getThumbnailUrl(r[`${field} Thumbnail`] || r[field])}
                                 alt={field}
                                 className="h-16 w-16 rounded-lg border border-gray-600"
                               />
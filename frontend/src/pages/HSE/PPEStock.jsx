@@ -69,7 +69,7 @@ export default function PPEStock() {
   const [editStockLoading, setEditStockLoading] = useState(false);
   const [stockSearch,      setStockSearch]      = useState("");
 
-  const [distEntries, setDistEntries] = useState([]);
+  const [inventory, setInventory] = useState([]);
 
   const [ppeTypes,        setPpeTypes]        = useState([]);
   const [typesLoading,    setTypesLoading]    = useState(true);
@@ -116,14 +116,14 @@ export default function PPEStock() {
     setTypesLoading(true);
     try {
       const headers = { Authorization: `Bearer ${token}` };
-      const [s, p, d] = await Promise.all([
-        fetch(`${API_BASE}/api/PPE_Stock`,            { headers }).then((r) => r.json()),
-        fetch(`${API_BASE}/api/PPE_Types`,            { headers }).then((r) => r.json()),
-        fetch(`${API_BASE}/api/PPE_Distribution_Log`, { headers }).then((r) => r.json()),
+      const [s, p, inv] = await Promise.all([
+        fetch(`${API_BASE}/api/PPE_Stock`,      { headers }).then((r) => r.json()),
+        fetch(`${API_BASE}/api/PPE_Types`,      { headers }).then((r) => r.json()),
+        fetch(`${API_BASE}/api/hse/inventory`,  { headers }).then((r) => r.json()),
       ]);
       setStockEntries(Array.isArray(s) ? s : []);
       setPpeTypes    (Array.isArray(p) ? p : []);
-      setDistEntries (Array.isArray(d) ? d : []);
+      setInventory   (Array.isArray(inv?.items) ? inv.items : []);
     } catch {
       showAlert("error", t("hse.stock.alerts.networkError"));
     } finally {
@@ -136,12 +136,12 @@ export default function PPEStock() {
     setStockLoading(true);
     try {
       const headers = { Authorization: `Bearer ${token}` };
-      const [s, d] = await Promise.all([
-        fetch(`${API_BASE}/api/PPE_Stock`,            { headers }).then((r) => r.json()),
-        fetch(`${API_BASE}/api/PPE_Distribution_Log`, { headers }).then((r) => r.json()),
+      const [s, inv] = await Promise.all([
+        fetch(`${API_BASE}/api/PPE_Stock`,     { headers }).then((r) => r.json()),
+        fetch(`${API_BASE}/api/hse/inventory`, { headers }).then((r) => r.json()),
       ]);
       setStockEntries(Array.isArray(s) ? s : []);
-      setDistEntries (Array.isArray(d) ? d : []);
+      setInventory   (Array.isArray(inv?.items) ? inv.items : []);
     } catch {
       showAlert("error", t("hse.stock.alerts.networkError"));
     } finally {
@@ -166,36 +166,21 @@ export default function PPEStock() {
 
   useEffect(() => { fetchAll(); }, []);
 
+  // Totals per type/size come precomputed from /api/hse/inventory
   const groupedSummary = useMemo(() => {
-    const now       = new Date();
-    const thisMonth = now.getMonth();
-    const thisYear  = now.getFullYear();
     const map = {};
-
-    stockEntries.forEach((e) => {
-      const type = e.PPE_Type; const size = e.Size || "";
-      if (!map[type]) map[type] = {};
-      if (!map[type][size]) map[type][size] = { restocked: 0, distributed: 0, distributedThisMonth: 0 };
-      map[type][size].restocked += Number(e.Quantity || 0);
-    });
-
-    distEntries.forEach((e) => {
-      const type = e.PPE_Type; const size = e.Size || "";
-      if (!map[type]) map[type] = {};
-      if (!map[type][size]) map[type][size] = { restocked: 0, distributed: 0, distributedThisMonth: 0 };
-      map[type][size].distributed += Number(e.Quantity || 0);
-      const d = new Date(e.Date || e.date || "");
-      if (!isNaN(d) && d.getMonth() === thisMonth && d.getFullYear() === thisYear)
-        map[type][size].distributedThisMonth += Number(e.Quantity || 0);
+    inventory.forEach((e) => {
+      const type = e.PPE_Type;
+      if (!map[type]) map[type] = [];
+      map[type].push({
+        size: e.Size || "",
+        available: Number(e.available || 0),
+        distributedThisMonth: Number(e.distributed_this_month || 0),
+      });
     });
 
     return Object.entries(map)
-      .map(([ppeType, sizeMap]) => {
-        const entries = Object.entries(sizeMap).map(([size, data]) => ({
-          size,
-          available: data.restocked - data.distributed,
-          distributedThisMonth: data.distributedThisMonth,
-        }));
+      .map(([ppeType, entries]) => {
         const hasSize = entries.some((s) => s.size !== "");
         const totalDistributedThisMonth = entries.reduce((a, s) => a + s.distributedThisMonth, 0);
         if (!hasSize) {
@@ -208,7 +193,7 @@ export default function PPEStock() {
         return { PPE_Type: ppeType, hasSize: true, sizes: sortedSizes, overallStatus, totalDistributedThisMonth };
       })
       .sort((a, b) => a.PPE_Type.localeCompare(b.PPE_Type));
-  }, [stockEntries, distEntries]);
+  }, [inventory]);
 
   const filteredGrouped = groupedSummary.filter((r) =>
     (r.PPE_Type || "").toLowerCase().includes(summarySearch.toLowerCase())
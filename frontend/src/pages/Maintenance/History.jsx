@@ -33,6 +33,14 @@ const getThumbnailUrl = (url) => {
   return url;
 };
 
+// Filter key -> Maintenance_Log column
+const FILTER_COLUMNS = {
+  model: "Model / Type",
+  plate: "Plate Number",
+  driver: "Driver",
+  performedBy: "Performed By",
+};
+
 /* ---------------- Component ---------------- */
 
 export default function MaintenanceHistory() {
@@ -42,6 +50,9 @@ export default function MaintenanceHistory() {
   const navigate = useNavigate();
 
   const [rows, setRows] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [options, setOptions] = useState({});
+  const [reloadKey, setReloadKey] = useState(0);
   const [loading, setLoading] = useState(true);
   const [expandedIndex, setExpandedIndex] = useState(null);
   const [deleteMode, setDeleteMode] = useState(false);
@@ -61,41 +72,6 @@ export default function MaintenanceHistory() {
   // ✅ Check if user can delete (Centralized from roles.js)
   const canDelete = canUserPerformAction(user?.role, 'MAINTENANCEHISTORY_DELETE');
 
-  /* ---------------- Load Maintenance Log ---------------- */
-
-  useEffect(() => {
-    async function load() {
-      try {
-        const token = localStorage.getItem("token");
-        const res = await fetch(`${CONFIG.BACKEND_URL}/api/Maintenance_Log`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        const data = await res.json();
-        if (Array.isArray(data)) {
-          // ✅ Step 1: Assign __row_index based on ORIGINAL sheet position (for delete/edit)
-          const withIndex = data.map((row, i) => ({
-            ...row,
-            __row_index: i + 2, // +2 because row 1 is headers, data starts at row 2
-          }));
-          
-          // ✅ Step 2: Sort by Date field for display (newest first)
-          const sorted = [...withIndex].sort((a, b) => {
-            const dateA = new Date(a.Date);
-            const dateB = new Date(b.Date);
-            return dateB - dateA; // Newest first
-          });
-          
-          setRows(sorted);
-        }
-      } catch (err) {
-        console.error("Error loading maintenance history:", err);
-      } finally {
-        setLoading(false);
-      }
-    }
-    load();
-  }, []);
-
   /* ---------------- Ensure Equipment Cache ---------------- */
 
   useEffect(() => {
@@ -127,70 +103,103 @@ export default function MaintenanceHistory() {
 
   /* ---------------- Filter Options ---------------- */
 
-  const modelOptions = useMemo(
-    () =>
-      Array.from(
-        new Set(rows.map((r) => r["Model / Type"]).filter(Boolean))
-      ).sort(),
-    [rows]
-  );
+  // Distinct column values from the server, so the whole log isn't downloaded
+  useEffect(() => {
+    async function loadOptions() {
+      try {
+        const params = new URLSearchParams({ limit: 1 });
+        Object.values(FILTER_COLUMNS).forEach((column) =>
+          params.append("options", column)
+        );
+        const token = localStorage.getItem("token");
+        const res = await fetch(
+          `${CONFIG.BACKEND_URL}/api/Maintenance_Log?${params}`,
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+        const data = await res.json();
+        if (data?.options) setOptions(data.options);
+      } catch (err) {
+        console.error("Error loading maintenance filters:", err);
+      }
+    }
+    loadOptions();
+  }, []);
 
-  const plateOptions = useMemo(
-    () =>
-      Array.from(
-        new Set(rows.map((r) => r["Plate Number"]).filter(Boolean))
-      ).sort(),
-    [rows]
-  );
+  const modelOptions = options[FILTER_COLUMNS.model] || [];
+  const plateOptions = options[FILTER_COLUMNS.plate] || [];
+  const driverOptions = options[FILTER_COLUMNS.driver] || [];
+  const performedByOptions = options[FILTER_COLUMNS.performedBy] || [];
 
-  const driverOptions = useMemo(
-    () =>
-      Array.from(new Set(rows.map((r) => r["Driver"]).filter(Boolean))).sort(),
-    [rows]
-  );
+  /* ---------------- Load Maintenance Log (one page, filtered on the server) ---------------- */
 
-  const performedByOptions = useMemo(
-    () =>
-      Array.from(
-        new Set(rows.map((r) => r["Performed By"]).filter(Boolean))
-      ).sort(),
-    [rows]
-  );
+  useEffect(() => {
+    let cancelled = false;
 
-  /* ---------------- Apply Filters ---------------- */
-
-  const filteredRows = useMemo(() => {
-    return rows.filter((r) => {
-      const date = r["Date"];
-      const model = r["Model / Type"] || "";
-      const plate = r["Plate Number"] || "";
-      const driver = r["Driver"] || "";
-      const performedBy = r["Performed By"] || "";
-
-      if (
-        user?.role === "Driver" &&
-        Array.isArray(driverAllowedPlates) &&
-        !driverAllowedPlates.includes(plate)
-      ) {
-        return false;
-      }
+    async function load() {
+      try {
+        const params = new URLSearchParams({
+          limit: itemsPerPage,
+          cursor: (currentPage - 1) * itemsPerPage,
+          sort: "-Date",
+        });
+        Object.entries(FILTER_COLUMNS).forEach(([key, column]) => {
+          if (filters[key]) params.append(column, filters[key]);
+        });
+        if (filters.from) params.append("from", filters.from);
+        if (filters.to) params.append("to", filters.to);
+
+        // ✅ Drivers only get the rows of their own plates
+        if (Array.isArray(driverAllowedPlates)) {
+          const plates = filters.plate
+            ? driverAllowedPlates.filter((p) => p === filters.plate)
+            : driverAllowedPlates;
+          if (plates.length === 0) {
+            setRows([]);
+            setTotal(0);
+            return;
+          }
+          params.delete(FILTER_COLUMNS.plate);
+          plates.forEach((p) => params.append(FILTER_COLUMNS.plate, p));
+        }
+
+        const token = localStorage.getItem("token");
+        const res = await fetch(
+          `${CONFIG.BACKEND_URL}/api/Maintenance_Log?${params}`,
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+        const data = await res.json();
+        if (cancelled || !Array.isArray(data?.rows)) return;
 
-      if (filters.model && model !== filters.model) return false;
-      if (filters.plate && plate !== filters.plate) return false;
-      if (filters.driver && driver !== filters.driver) return false;
-      if (filters.performedBy && performedBy !== filters.performedBy)
-        return false;
+        // Page emptied by a delete: step back to the new last page
+        if (data.rows.length === 0 && currentPage > 1) {
+          setCurrentPage(Math.max(1, Math.ceil(data.total / itemsPerPage)));
+          return;
+        }
 
-      if (filters.from && date < filters.from) return false;
-      if (filters.to && date > filters.to) return false;
+        // ✅ rowindex is the row's sheet position (for delete/edit)
+        setRows(data.rows.map((row) => ({ ...row, __row_index: row.rowindex })));
+        setTotal(data.total);
+      } catch (err) {
+        console.error("Error loading maintenance history:", err);
+      } finally {
+        if (!cancelled) setLoading(false);
+      }
+    }
+    load();
 
-      return true;
-    });
-  }, [rows, filters, user, driverAllowedPlates]);
+    return () => {
+      cancelled = true;
+    };
+  }, [filters, currentPage, driverAllowedPlates, reloadKey]);
 
-  const totalPages = Math.ceil(filteredRows.length / itemsPerPage);
+  const totalPages = Math.ceil(total / itemsPerPage);
   const startIndex = (currentPage - 1) * itemsPerPage;
-  const paginatedRows = filteredRows.slice(startIndex, startIndex + itemsPerPage);
+  const paginatedRows = rows;
+
+  const updateFilter = (key, value) => {
+    setFilters((f) => ({ ...f, [key]: value }));
+    setCurrentPage(1);
+  };
 
   const resetFilters = () => {
     setFilters({
@@ -211,8 +220,7 @@ export default function MaintenanceHistory() {
   /* ---------------- Delete ---------------- */
 
   const handleDelete = async (rowIndexInPage) => {
-    const actualIndex = startIndex + rowIndexInPage;
-    const rowToDelete = filteredRows[actualIndex];
+    const rowToDelete = rows[rowIndexInPage];
 
     const confirmDelete = window.confirm(
       t("maintenance.history.deleteConfirm")
@@ -231,9 +239,8 @@ export default function MaintenanceHistory() {
       );
       const result = await res.json();
       if (result.status === "success") {
-        setRows((prev) =>
-          prev.filter((r) => r.__row_index !== rowToDelete.__row_index)
-        );
+        // Rows below it moved up a line: reload the page
+        setReloadKey((k) => k + 1);
         alert(t("maintenance.history.deleteSuccess"));
       } else {
         alert(t("maintenance.history.deleteError"));
@@ -306,9 +313,7 @@ export default function MaintenanceHistory() {
           <div className="grid md:grid-cols-6 sm:grid-cols-2 gap-4">
             <select
               value={filters.model}
-              onChange={(e) =>
-                setFilters((f) => ({ ...f, model: e.target.value }))
-              }
+              onChange={(e) => updateFilter("model", e.target.value)}
               className="p-2 rounded-lg bg-gray-900 border border-gray-700"
             >
               <option value="">{t("maintenance.history.filters.model")}</option>
@@ -319,9 +324,7 @@ export default function MaintenanceHistory() {
 
             <select
               value={filters.plate}
-              onChange={(e) =>
-                setFilters((f) => ({ ...f, plate: e.target.value }))
-              }
+              onChange={(e) => updateFilter("plate", e.target.value)}
               className="p-2 rounded-lg bg-gray-900 border border-gray-700"
             >
               <option value="">{t("maintenance.history.filters.plate")}</option>
@@ -332,9 +335,7 @@ export default function MaintenanceHistory() {
 
             <select
               value={filters.driver}
-              onChange={(e) =>
-                setFilters((f) => ({ ...f, driver: e.target.value }))
-              }
+              onChange={(e) => updateFilter("driver", e.target.value)}
               className="p-2 rounded-lg bg-gray-900 border border-gray-700"
             >
               <option value="">{t("maintenance.history.filters.driver")}</option>
@@ -345,9 +346,7 @@ export default function MaintenanceHistory() {
 
             <select
               value={filters.performedBy}
-              onChange={(e) =>
-                setFilters((f) => ({ ...f, performedBy: e.target.value }))
-              }
+              onChange={(e) => updateFilter("performedBy", e.target.value)}
               className="p-2 rounded-lg bg-gray-900 border border-gray-700"
             >
               <option value="">
@@ -361,18 +360,14 @@ export default function MaintenanceHistory() {
             <input
               type="date"
               value={filters.from}
-              onChange={(e) =>
-                setFilters((f) => ({ ...f, from: e.target.value }))
-              }
+              onChange={(e) => updateFilter("from", e.target.value)}
               className="p-2 rounded-lg bg-gray-900 border border-gray-700"
             />
 
             <input
               type="date"
               value={filters.to}
-              onChange={(e) =>
-                setFilters((f) => ({ ...f, to: e.target.value }))
-              }
+              onChange={(e) => updateFilter("to", e.target.value)}
               className="p-2 rounded-lg bg-gray-900 border border-gray-700"
             />
           </div>
@@ -498,7 +493,7 @@ export default function MaintenanceHistory() {
                                     className="relative group inline-block"
                                   >
                                     <img
-                                      src={getThumbnailUrl(r[field])}
+                                      src={getThumbnailUrl(r[`${field} Thumbnail`] || r[field])}
                                       alt={field}
                                       className="h-20 w-20 rounded-lg border border-gray-600"
                                     />
@@ -522,7 +517,7 @@ export default function MaintenanceHistory() {
                               className="relative group inline-block"
                             >
                               <img
-                                src={getThumbnailUrl(r["Photo Repair/Problem"])}
+                                src={getThumbnailUrl(r["Photo Repair/Problem Thumbnail"] || r["Photo Repair/Problem"])}
                                 alt="Photo Repair/Problem"
                                 className="h-20 w-20 rounded-lg border border-gray-600"
                               />
@@ -612,7 +607,7 @@ export default function MaintenanceHistory() {
                                 className="relative group block"
                               >
                                 <img
-                                  src={getThumbnailUrl(r[field])}
+                                  src={getThumbnailUrl(r[`${field} Thumbnail`] || r[field])}
                                   alt={field}
                                   className="h-16 w-16 rounded-lg border border-gray-600"
                                 />